@@ -78,14 +78,29 @@ import copy
 import json
 import configparser
 import threading
+import queue
 import re
 import gzip
+import zlib
+import tarfile
 import pytz
 import argparse
 _ns = argparse.Namespace
 import itertools
 import binascii
 import signal
+import functools
+import bisect
+import mmap
+import select
+import struct
+import ctypes, ctypes.util
+import concurrent.futures
+import array
+try:
+    import numpy as np        # Optional: parseAccessBatch's numeric columns.
+except ImportError:
+    np = None
 
 gP2 = (sys.version_info[0] == 2)
 gP3 = (sys.version_info[0] == 3)
@@ -134,7 +149,7 @@ ENCODING = 'utf-8'          # Start a utf-8 chain, whether to file or xlog.
 ERRORS = 'strict'
 OXLOGTS = 0                 # Time of last Tx to xlog.
 TXRATE = 0                  # Max number of transmissions per sec.
-                            # Transformed to 1 / TXRATE after INI read.
+                            # Now TXRECS of the TXBUCKET token buckets.
 AEL, ASL = '0', '?'         # !MAGIC!  ACCESS EL and SL (error and sub levels).
 EEL, ESL = '0', '?'         # !MAGIC!  ERROR  ... 
                             # *EL = 0: unset
@@ -144,6 +159,13 @@ SELF_SUBID = '____'         # Self logging subid. Set by message.
 
 AELOGTYPES = ('access', 'error')
 
+LOGFORMAT = None            # nginx log_format string of the access logs (INI 'logformat').
+                            # None -> nginx's 'combined' (parseAccessLogrec/genACCESSorec).
+                            # E.g.: $remote_addr - $remote_user [$time_local] "$request" 
+                            #       $status $body_bytes_sent "$http_referer" "$http_user_agent" 
+                            #       $request_time $upstream_response_time $host
+ACCESSLF = None             # LOGFORMAT, compiled by compileLogFormat.
+
 # Do our own log rolling?
 DO_LOGROLL = None                   # Setting ROLLPERIOD sets this.
 
@@ -377,9 +399,11 @@ def isFORCEROLL():
     """Force a roll (with a flag file)?"""
     1/1
     p = os.path.join(WATCHPATH, FORCEROLL_FN)
+    if SNAPSHOT and FORCEROLL_FN not in SNAPSHOT.files(WATCHPATH):
+        return
     if os.path.isfile(p):
         1/1
-        os.remove(p)
+        removeFile(p)
         return True
 
 def getROLLSTATE():
@@ -474,15 +498,69 @@ def _S(s):
         s = None
     return s
 
-_LOCTZ = pytz.timezone('America/Vancouver')
+LOCTZ = 'America/Vancouver'  # Zone of the (naive) error log timestamps.
+_LOCTZ = pytz.timezone(LOCTZ)
+CLFCACHESIZE = 4096         # Memoized CLF timestamp strings (many lines share a second).
+
+_CLFMONTHS = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr':  4, 'May':  5, 'Jun':  6,
+              'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+
+# _LOCTZ's DST transitions, precomputed as local wall-time windows.
+#   _LOCTZTAB.hi[i]:  wall time from which _LOCTZTAB.off[i] applies.
+#   _LOCTZTAB.lo[i]:  start of the gap (nonexistent) or overlap 
+#                     (ambiguous) window ending at hi[i].
+_LOCTZTAB = None
+def locTzTable():
+    """Build (once) the wall-time transition table for _LOCTZ."""
+    global _LOCTZTAB
+    if _LOCTZTAB is None:
+        lo, hi, off = [], [], []
+        uts = getattr(_LOCTZ, '_utc_transition_times', None)
+        tis = getattr(_LOCTZ, '_transition_info', None)
+        if uts and tis:
+            for x, (udt, ti) in enumerate(zip(uts, tis)):
+                u = calendar.timegm(udt.timetuple())
+                o = int(ti[0].total_seconds())
+                p = int(tis[x-1][0].total_seconds()) if x else o
+                lo.append(u + min(o, p))
+                hi.append(u + max(o, p))
+                off.append(o)
+        _LOCTZTAB = _ns(lo=lo, hi=hi, off=off)
+    return _LOCTZTAB
+
+# Local wall unix-time -> utc unix-time via the table.
+# None for ambiguous/nonexistent times (or no table): caller uses pytz.
+def locTzWall2utcut(lw):
+    t = locTzTable()
+    x = bisect.bisect_right(t.hi, lw) - 1
+    if x < 0:
+        return
+    if x + 1 < len(t.lo) and lw >= t.lo[x+1]:
+        return
+    return lw - t.off[x]
 
 # Common Log Format local time str to utc unix-time.
 # Depends on whether access or error log.
+# Memoized, so a cache miss is only paid once per distinct second.
 def CLFlocstr2utcut(ae, locstr):
     # CLF local time to utc.
     # ae==a: [03/Apr/2015:16:56:14 -0700]
     # ae==e: 2015/07/05 23:02:54
+    return _CLFlocstr2utcut(ae, locstr)
+
+@functools.lru_cache(maxsize=CLFCACHESIZE)
+def _CLFlocstr2utcut(ae, locstr):
     if ae == 'a':
+        # Integer arithmetic for the fixed nginx layout.
+        z = locstr
+        if len(z) == 28 and z[3] == z[7] == '/' and z[12] == ':' and z[22] in ('+', '-'):
+            try:    month = _CLFMONTHS[z[4:7]]
+            except KeyError:
+                raise ValueError('bad month: {!r}'.format(z[4:7]))
+            lw = calendar.timegm(datetime.datetime(int(z[8:12]), month, int(z[1:3]), 
+                                 int(z[13:15]), int(z[16:18]), int(z[19:21])).timetuple())
+            o = int(z[23:25]) * 3600 + int(z[25:27]) * 60
+            return lw + o if z[22] == '-' else lw - o
         locstr = locstr[1:-1]
         locdt = datetime.datetime.strptime(locstr, '%d/%b/%Y:%H:%M:%S %z')
         utcdt = locdt.astimezone(pytz.utc)
@@ -490,6 +568,13 @@ def CLFlocstr2utcut(ae, locstr):
         pass
     elif ae == 'e':
         locstr = locstr.strip()
+        z = locstr
+        if len(z) == 19 and z[4] == z[7] == '/' and z[13] == z[16] == ':':
+            lw = calendar.timegm(datetime.datetime(int(z[0:4]), int(z[5:7]), int(z[8:10]), 
+                                 int(z[11:13]), int(z[14:16]), int(z[17:19])).timetuple())
+            utcut = locTzWall2utcut(lw)
+            if utcut is not None:
+                return utcut
         locnaive = datetime.datetime.strptime(locstr, '%Y/%m/%d %H:%M:%S')
         locdt = _LOCTZ.localize(locnaive, is_dst=None)
         utcdt = locdt.astimezone(pytz.utc)
@@ -523,6 +608,238 @@ def ip15(ip, zeros=True):
 
 ####################################################################################################
 
+#
+# compileJSONSchema
+#
+# Records of a given type (access, error, heartbeat, log_format) always
+# have the same keys.  The sorted key skeleton is built once, so each
+# record only costs its value encodings.  Output is byte-identical to
+# json.dumps(logdict, ensure_ascii=True, sort_keys=True), which is also
+# the fallback for dicts that don't fit the schema.
+#
+_JSONSTR = json.encoder.encode_basestring_ascii
+
+def compileJSONSchema(keys):
+    """Return a dumps(logdict) for dicts with exactly these keys."""
+    keys = tuple(sorted(keys))
+    n = len(keys)
+    skeleton = '{' + ', '.join(_JSONSTR(k) + ': %s' for k in keys) + '}'
+    def dumps(logdict):
+        if len(logdict) == n:
+            try:
+                return skeleton % tuple([
+                    _JSONSTR(v) if v.__class__ is str else 
+                    'null' if v is None else 
+                    int.__repr__(v) if v.__class__ is int else 
+                    json.dumps(v, ensure_ascii=True, sort_keys=True)
+                    for v in map(logdict.__getitem__, keys)])
+            except KeyError: 
+                pass
+        return json.dumps(logdict, ensure_ascii=True, sort_keys=True)
+    return dumps
+
+ORECKEYS = ('_ip', '_ts', '_id', '_si', '_el', '_sl', 'ae')
+ACCESSKEYS = ORECKEYS + ('remote_addr', 'remote_user', 'time_local', 'time_utc', 'status', 
+                         'request', 'body_bytes_sent', 'http_referer', 'http_user_agent')
+HEARTBEATKEYS = ORECKEYS + ('dt_utc', 'dt_loc', 'oxlog_stall', 'tx_fill')
+dumpsACCESS = compileJSONSchema(ACCESSKEYS)
+dumpsHEARTBEAT = compileJSONSchema(HEARTBEATKEYS)
+
+#
+# benchJSONSchema
+#
+def benchJSONSchema(pfn=None, n=None):
+    """Time dumpsACCESS against json.dumps on access logrecs from pfn."""
+    if pfn:
+        with (gzip.open(pfn, 'rt', encoding=ENCODING, errors=ERRORS) if pfn.endswith('.gz') else 
+              open(pfn, 'r', encoding=ENCODING, errors=ERRORS)) as f:
+            logrecs = list(itertools.islice(f, n))
+    else:
+        logrecs = [A0, A2, A4, A6] * ((n or 100000) // 4)
+    logdicts = []
+    for logrec in logrecs:
+        rc, rm, chunks = parseAccessLogrec('a', logrec.strip())
+        if rc == 0 and len(chunks) == 10:
+            rc, rm, orec, vrec = genACCESSorec(chunks, 'a', AEL, 'a', SRCID, SUBID)
+            if rc == 0:
+                logdicts.append(json.loads(orec))
+    t0 = time.perf_counter()
+    y = [json.dumps(z, ensure_ascii=True, sort_keys=True) for z in logdicts]
+    t1 = time.perf_counter()
+    x = [dumpsACCESS(z) for z in logdicts]
+    t2 = time.perf_counter()
+    nbad = sum(1 for a, b in zip(x, y) if a != b)
+    # Dict-valued fields (heartbeat tx_fill) too.
+    hb = {'_ip': None, '_ts': '0', '_id': SRCID, '_si': SUBID, '_el': '0', '_sl': 'h', 'ae': 'h',
+          'dt_utc': '', 'dt_loc': '', 'oxlog_stall': 0.5, 
+          'tx_fill': {'recs': 0.5, 'bytes': None}}
+    nbad += dumpsHEARTBEAT(hb) != json.dumps(hb, ensure_ascii=True, sort_keys=True)
+    msg = 'json.dumps: {:.3f}s  dumpsACCESS: {:.3f}s  x{:.2f}  ({:,d} recs, {} mismatches)'\
+          .format(t1 - t0, t2 - t1, (t1 - t0) / max(t2 - t1, 1e-9), len(logdicts), nbad)
+    _sl.info(msg)
+    return nbad
+
+#
+# Binary orecs (ORECFORMAT 'binary').
+#
+# A compact alternative to the JSON text orecs:  varint(body length) +
+# body, body = varint(schema id) + the values, in the schema's (sorted)
+# key order, each a tag byte + data:  0 None, 1 str (varint length + 
+# UTF-8, no escapes), 2 int (varint of zigzag, |v| < 8192), 3 float 
+# ('<d'), 4 True, 5 False, 6 other (varint length + JSON), 7 int ('<q').
+# A schema id is derived from its keys (binarySchemaId), so both ends 
+# can know it; id 0 is a dict that didn't fit its schema (or has an int
+# too big for '<q'), as JSON.  Decorated orecs stay text (orecText).  The 
+# same records go to OXLOG and OFILE (self-delimiting, no newlines).
+# loadsBinary/iterBinary decode (to the dict json.loads would give).
+#
+ORECFORMAT = 'json'         # 'json' or 'binary' (INI 'orecformat').
+
+_BSCHEMAS = {}              # Schema id -> keys.
+
+def _varint(n):
+    out = bytearray()
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+_VARINTS = [_varint(n) for n in range(1 << 14)]
+_STRHDRS = [b'\x01' + z for z in _VARINTS[:128]]
+_SMALLINTS = {v: b'\x02' + _VARINTS[(v << 1) ^ (v >> 63)] for v in range(-8192, 8192)}
+_BFLOAT = struct.Struct('<d')
+_BINT = struct.Struct('<q')
+
+def binarySchemaId(keys):
+    return binascii.crc32(','.join(sorted(keys)).encode('ascii')) & 0x3fff or 1
+
+def compileBinarySchema(keys):
+    """Return a dumps(logdict) -> binary orec, for dicts with exactly these keys."""
+    keys = tuple(sorted(keys))
+    sid = binarySchemaId(keys)
+    if _BSCHEMAS.get(sid, keys) != keys:
+        raise ValueError('binary schema id {} collision'.format(sid))
+    _BSCHEMAS[sid] = keys
+    n = len(keys)
+    head = _varint(sid)
+    smallints, strhdrs, varints = _SMALLINTS, _STRHDRS, _VARINTS
+    def dumps(logdict):
+        if len(logdict) == n:
+            out = [head]
+            try:
+                for v in map(logdict.__getitem__, keys):
+                    c = v.__class__
+                    if c is str:
+                        b = v.encode(ENCODING, ERRORS)
+                        out.append(strhdrs[len(b)] if len(b) < 128 else b'\x01' + _varint(len(b)))
+                        out.append(b)
+                    elif v is None:
+                        out.append(b'\x00')
+                    elif c is int:
+                        out.append(smallints.get(v) or b'\x07' + _BINT.pack(v))
+                    elif c is float:
+                        out.append(b'\x03' + _BFLOAT.pack(v))
+                    elif c is bool:
+                        out.append(b'\x04' if v else b'\x05')
+                    else:
+                        b = json.dumps(v, ensure_ascii=False).encode(ENCODING, ERRORS)
+                        out.append(b'\x06' + _varint(len(b)))
+                        out.append(b)
+                body = b''.join(out)
+                return (varints[len(body)] if len(body) < 16384 else _varint(len(body))) + body
+            except (KeyError, struct.error):
+                pass                            # Other keys, or an int beyond '<q'.
+        body = b'\x00' + json.dumps(logdict, ensure_ascii=False, sort_keys=True).encode(ENCODING, ERRORS)
+        return _varint(len(body)) + body
+    return dumps
+
+def _readVarint(buf, pos):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+def loadsBinary(buf, pos=0):
+    """Decode the binary orec at buf[pos:].  Returns logdict, pos after it."""
+    z, pos = _readVarint(buf, pos)
+    end = pos + z
+    sid, pos = _readVarint(buf, pos)
+    if sid == 0:
+        return json.loads(bytes(buf[pos:end]).decode(ENCODING, ERRORS)), end
+    logdict = {}
+    for key in _BSCHEMAS[sid]:
+        tag = buf[pos]
+        pos += 1
+        if   tag == 0:
+            v = None
+        elif tag in (1, 6):
+            z, pos = _readVarint(buf, pos)
+            v = bytes(buf[pos:pos+z]).decode(ENCODING, ERRORS)
+            if tag == 6:
+                v = json.loads(v)
+            pos += z
+        elif tag == 2:
+            z, pos = _readVarint(buf, pos)
+            v = (z >> 1) ^ -(z & 1)
+        elif tag == 3:
+            (v,) = _BFLOAT.unpack_from(buf, pos)
+            pos += 8
+        elif tag in (4, 5):
+            v = (tag == 4)
+        elif tag == 7:
+            (v,) = _BINT.unpack_from(buf, pos)
+            pos += 8
+        else:
+            raise ValueError('bad binary orec tag {} @ {}'.format(tag, pos - 1))
+        logdict[key] = v
+    if pos != end:
+        raise ValueError('bad binary orec length @ {}'.format(end))
+    return logdict, end
+
+def iterBinary(buf):
+    """Yield the logdicts of concatenated binary orecs."""
+    pos = 0
+    while pos < len(buf):
+        logdict, pos = loadsBinary(buf, pos)
+        yield logdict
+
+def compileOrecSchema(keys):
+    """compileJSONSchema or compileBinarySchema, per ORECFORMAT."""
+    if ORECFORMAT == 'binary':
+        return compileBinarySchema(keys)
+    return compileJSONSchema(keys)
+
+def setOrecFormat(fmt):
+    """ORECFORMAT = fmt, recompiling the orec dumps."""
+    global ORECFORMAT, dumpsACCESS, dumpsHEARTBEAT, dumpsERROR
+    if fmt not in ('json', 'binary'):
+        raise ValueError('unknown orecformat: {}'.format(fmt))
+    ORECFORMAT = fmt
+    dumpsACCESS = compileOrecSchema(ACCESSKEYS)
+    dumpsHEARTBEAT = compileOrecSchema(HEARTBEATKEYS)
+    dumpsERROR = compileOrecSchema(ERRORKEYS)
+    if ACCESSLF:
+        ACCESSLF.dumps = compileOrecSchema(ACCESSLF.keys)
+
+def orecBytes(orec):
+    """An orec (JSON str or binary) as bytes to send."""
+    if orec.__class__ is bytes:
+        return orec
+    return orec.encode(encoding=ENCODING, errors=ERRORS)
+
+def orecText(orec):
+    """An orec (JSON str or binary) as JSON text (decorated orecs, ydata)."""
+    if orec.__class__ is bytes:
+        return json.dumps(loadsBinary(orec)[0], ensure_ascii=True, sort_keys=True)
+    return orec
+
+####################################################################################################
+
 # Example access and error log data:
 
 ''' ACCESS...
@@ -582,17 +899,17 @@ A6 = '80.69.249.123 - - [11/Dec/2015:14:58:49 -0800] "HEAD / HTTP/1.0" 200 0 "-"
 A7 = '{"_el": "0", "_id": "TEST", "_ip": null, "_si": "test", "_sl": "_", "_ts": "1449874729.    ", "ae": "a", "body_bytes_sent": 0, "http_referer": null, "http_user_agent": null, "remote_addr": "80.69.249.123", "remote_user": null, "request": "HEAD / HTTP/1.0", "status": 200, "time_local": "[11/Dec/2015:14:58:49 -0800]", "time_utc": 1449874729}'
 
 E0 = '2015/08/03 17:48:28 [error] 1199#0: *2502 open() "/var/www/184.69.80.202/wordpress/wp-login.php" failed (2: No such file or directory), client: 58.8.154.9, server: 184.69.80.202, request: "GET /wordpress/wp-login.php HTTP/1.1", host: "wp.go-print.com"'
-E1 = '{"_el": "0", "_id": "TEST", "_ip": null, "_si": "test", "_sl": "_", "_ts": "1438649308.    ", "ae": "e", "status": "[error]", "stuff": "1199#0:\\t*2502\\topen()\\t\\"/var/www/184.69.80.202/wordpress/wp-login.php\\"\\tfailed\\t(2:\\tNo\\tsuch\\tfile\\tor\\tdirectory),\\tclient:\\t58.8.154.9,\\tserver:\\t184.69.80.202,\\trequest:\\t\\"GET /wordpress/wp-login.php HTTP/1.1\\",\\thost:\\t\\"wp.go-print.com\\"", "time_local": "2015/08/03 17:48:28", "time_utc": 1438649308}'
+E1 = '{"_el": "0", "_id": "TEST", "_ip": null, "_si": "test", "_sl": "_", "_ts": "1438649308.    ", "ae": "e", "connection": 2502, "host": "wp.go-print.com", "http_referer": null, "pid": 1199, "remote_addr": "58.8.154.9", "request": "GET /wordpress/wp-login.php HTTP/1.1", "server": "184.69.80.202", "status": "[error]", "stuff": "1199#0:\\t*2502\\topen()\\t\\"/var/www/184.69.80.202/wordpress/wp-login.php\\"\\tfailed\\t(2:\\tNo\\tsuch\\tfile\\tor\\tdirectory),\\tclient:\\t58.8.154.9,\\tserver:\\t184.69.80.202,\\trequest:\\t\\"GET /wordpress/wp-login.php HTTP/1.1\\",\\thost:\\t\\"wp.go-print.com\\"", "tid": 0, "time_local": "2015/08/03 17:48:28", "time_utc": 1438649308, "upstream": null}'
 
 E2 = '2015/11/24 07:59:59 [error] 32408#0: *1 open() "/usr/share/nginx/html/pages/j-kelly-dresser.html" failed (2: No such file or directory), client: 184.69.80.202, server: kellydresser.com, request: "GET / HTTP/1.1", host: "kellydresser.com"'
-E3 = '{"_el": "0", "_id": "TEST", "_ip": null, "_si": "test", "_sl": "_", "_ts": "1448380799.    ", "ae": "e", "status": "[error]", "stuff": "32408#0:\\t*1\\topen()\\t\\"/usr/share/nginx/html/pages/j-kelly-dresser.html\\"\\tfailed\\t(2:\\tNo\\tsuch\\tfile\\tor\\tdirectory),\\tclient:\\t184.69.80.202,\\tserver:\\tkellydresser.com,\\trequest:\\t\\"GET / HTTP/1.1\\",\\thost:\\t\\"kellydresser.com\\"", "time_local": "2015/11/24 07:59:59", "time_utc": 1448380799}'
+E3 = '{"_el": "0", "_id": "TEST", "_ip": null, "_si": "test", "_sl": "_", "_ts": "1448380799.    ", "ae": "e", "connection": 1, "host": "kellydresser.com", "http_referer": null, "pid": 32408, "remote_addr": "184.69.80.202", "request": "GET / HTTP/1.1", "server": "kellydresser.com", "status": "[error]", "stuff": "32408#0:\\t*1\\topen()\\t\\"/usr/share/nginx/html/pages/j-kelly-dresser.html\\"\\tfailed\\t(2:\\tNo\\tsuch\\tfile\\tor\\tdirectory),\\tclient:\\t184.69.80.202,\\tserver:\\tkellydresser.com,\\trequest:\\t\\"GET / HTTP/1.1\\",\\thost:\\t\\"kellydresser.com\\"", "tid": 0, "time_local": "2015/11/24 07:59:59", "time_utc": 1448380799, "upstream": null}'
 
 E4 = '2015/11/24 07:59:56 [warn] 32401#0: only the last index in "index" directive should be absolute in /etc/nginx/vhosts.cfg:113'
-E5 = '{"_el": "0", "_id": "TEST", "_ip": null, "_si": "test", "_sl": "_", "_ts": "1448380796.    ", "ae": "e", "status": "[warn]", "stuff": "32401#0:\\tonly\\tthe\\tlast\\tindex\\tin\\t\\"index\\"\\tdirective\\tshould\\tbe\\tabsolute\\tin\\t/etc/nginx/vhosts.cfg:113", "time_local": "2015/11/24 07:59:56", "time_utc": 1448380796}'
+E5 = '{"_el": "0", "_id": "TEST", "_ip": null, "_si": "test", "_sl": "_", "_ts": "1448380796.    ", "ae": "e", "connection": null, "host": null, "http_referer": null, "pid": 32401, "remote_addr": null, "request": null, "server": null, "status": "[warn]", "stuff": "32401#0:\\tonly\\tthe\\tlast\\tindex\\tin\\t\\"index\\"\\tdirective\\tshould\\tbe\\tabsolute\\tin\\t/etc/nginx/vhosts.cfg:113", "tid": 0, "time_local": "2015/11/24 07:59:56", "time_utc": 1448380796, "upstream": null}'
 
 E6 = '2015/07/08 10:18:54 [error] 24152#0: *11229 open() "/var/www/184.69.80.202/ROADS/cgi-bin/search.plHTTP/1.0"" failed (2: No such file or directory), client: 31.184.194.114, server: 184.69.80.202, request: "GET /ROADS/cgi-bin/search.plHTTP/1.0" HTTP/1.1", host: "184.69.80.202"'
 #6 = '2015/07/08 10:18:54 [error] 24152#0: *11229 open() "/var/www/184.69.80.202/ROADS/cgi-bin/search.pl" failed (2: No such file or directory), client: 31.184.194.114, server: 184.69.80.202, request: "GET /ROADS/cgi-bin/search.pl HTTP/1.1", host: "184.69.80.202"'
-E7 = '{"_el": "0", "_id": "TEST", "_ip": null, "_si": "test", "_sl": "_", "_ts": "1436375934.    ", "ae": "e", "status": "[error]", "stuff": "24152#0:\\t*11229\\topen()\\t\\"/var/www/184.69.80.202/ROADS/cgi-bin/search.pl\\"\\tfailed\\t(2:\\tNo\\tsuch\\tfile\\tor\\tdirectory),\\tclient:\\t31.184.194.114,\\tserver:\\t184.69.80.202,\\trequest:\\t\\"GET /ROADS/cgi-bin/search.pl HTTP/1.1\\",\\thost:\\t\\"184.69.80.202\\"", "time_local": "2015/07/08 10:18:54", "time_utc": 1436375934}'
+E7 = '{"_el": "0", "_id": "TEST", "_ip": null, "_si": "test", "_sl": "_", "_ts": "1436375934.    ", "ae": "e", "connection": 11229, "host": "184.69.80.202", "http_referer": null, "pid": 24152, "remote_addr": "31.184.194.114", "request": "GET /ROADS/cgi-bin/search.pl HTTP/1.1", "server": "184.69.80.202", "status": "[error]", "stuff": "24152#0:\\t*11229\\topen()\\t\\"/var/www/184.69.80.202/ROADS/cgi-bin/search.pl\\"\\tfailed\\t(2:\\tNo\\tsuch\\tfile\\tor\\tdirectory),\\tclient:\\t31.184.194.114,\\tserver:\\t184.69.80.202,\\trequest:\\t\\"GET /ROADS/cgi-bin/search.pl HTTP/1.1\\",\\thost:\\t\\"184.69.80.202\\"", "tid": 0, "time_local": "2015/07/08 10:18:54", "time_utc": 1436375934, "upstream": null}'
 
 #
 # parseLogrec   
@@ -682,6 +999,56 @@ def parseLogrec(ae, logrec):
             rc, rm, chunks = rc, rm, chunks
         1/1
 
+#
+# parseAccessLogrec
+#
+# One compiled pattern for nginx's 'combined' access format.  Produces
+# the same 10 chunks (quotes kept) that parseLogrec produces, in a single
+# scan.  The request and referer are matched lazily up to the next
+# well-formed field boundary, so stray embedded quotes don't break the
+# split.  Lines the pattern can't match are handed to parseLogrec.
+#
+_ACCESS_RE = re.compile(r'(\S+) (\S+) (\S+) (\[\S+) (\S+\]) '
+                        r'(".*?") (\d+) (\d+) (".*?") (".*")$')
+_HTTP10Q = 'HTTP/1.0"'
+def fixAccessQuirks(logrec):
+    """Same pre-passes as parseLogrec, but only when needed."""
+    if '  ' in logrec:
+        logrec = logrec.replace('  ', ' ')
+    # nginx quirk: see parseLogrec.  Its first occurrence decides.
+    x = logrec.find(_HTTP10Q)
+    if x != -1 and logrec[x-1] != ' ':
+        logrec = logrec.replace(_HTTP10Q, '')
+    return logrec
+
+def parseAccessLogrec(ae, logrec):
+    """Parse an access logrec into chunks (fast path)."""
+    logrec = fixAccessQuirks(logrec)
+    m = _ACCESS_RE.match(logrec)
+    if not m:
+        return parseLogrec(ae, logrec)
+    chunks = list(m.groups())
+    # OK to lose a quoted blank (request, referer).
+    if chunks[5] == '" "':
+        chunks[5] = '"_"'
+    if chunks[8] == '" "':
+        chunks[8] = '"_"'
+    return 0, 'OK', chunks
+
+#
+# checkAccessParser
+#
+def checkAccessParser(logrecs=(A0, A2, A4, A6)):
+    """Check that parseAccessLogrec and parseLogrec agree."""
+    nbad = 0
+    for logrec in logrecs:
+        z = parseLogrec('a', logrec)
+        y = parseAccessLogrec('a', logrec)
+        if y != z:
+            nbad += 1
+            _yl.error(None, 'access parser mismatch: {} != {}'.format(y, z))
+    return nbad
+
 #
 # genACCESSorec
 #
@@ -740,10 +1107,10 @@ def genACCESSorec(chunks, ae, el, sl, srcid, subid, decorated=False):
         }
 
         rc, rm = 0, 'OK'        
-        ldj = json.dumps(logdict, ensure_ascii=True, sort_keys=True)
+        ldj = dumpsACCESS(logdict)
         if decorated:
             # Prepend a copy of the timetamp (for sorting).
-            orec = '{}|{}|{}'.format(logdict['_ts'], ae, ldj)  
+            orec = '{}|{}|{}'.format(logdict['_ts'], ae, orecText(ldj))  
         else:
             orec = ldj
 
@@ -760,22 +1127,161 @@ def genACCESSorec(chunks, ae, el, sl, srcid, subid, decorated=False):
     finally:
         1/1
 
+#
+# compileLogFormat
+#
+# An nginx log_format string is compiled (once) into a regex, one group
+# per $variable, and a list of typed converters for the record builder.
+# Quoted variables match lazily up to their closing quote, [$time_local]
+# up to its ']', $upstream_* lists as a unit, everything else is a 
+# blank-free word.
+#
+_NGXVAR_RE = re.compile(r'\$(?:\{(\w+)\}|(\w+))')
+_NGXINTS = {'status', 'body_bytes_sent', 'bytes_sent', 'request_length', 
+            'connection', 'connection_requests', 'pid', 'server_port', 'remote_port'}
+_NGXFLOATS = {'request_time', 'msec', 'upstream_response_time', 
+              'upstream_connect_time', 'upstream_header_time'}
+
+def _ngxInt(s):
+    if s in ('', '-'):
+        return
+    return int(s)
+
+def _ngxFloat(s):
+    # Multiple upstreams ('0.001, 0.002') stay as strings.
+    if s in ('', '-'):
+        return
+    try:    return float(s)
+    except: return _S(s)
+
+def compileLogFormat(lf):
+    """Compile an nginx log_format string into an access log parser."""
+    me = 'compileLogFormat'
+    try:
+        lf = ' '.join(lf.split())
+        pattern, names, convs = [], [], []
+        x = 0
+        for m in _NGXVAR_RE.finditer(lf):
+            lit = lf[x:m.start()]
+            pattern.append(re.escape(lit))
+            name = m.group(1) or m.group(2)
+            nxt = lf[m.end():m.end()+1]
+            if lit.endswith('"'):
+                pattern.append('(.*?)')
+            elif nxt == ']':
+                pattern.append(r'([^\]]*)')
+            elif name.startswith('upstream_'):
+                # One value per upstream tried: ', ' and ' : ' separated.
+                pattern.append(r'(\S*(?:(?:, | : )\S+)*)')
+            else:
+                pattern.append(r'(\S*)')
+            names.append(name)
+            if   name in _NGXINTS:    convs.append(_ngxInt)
+            elif name in _NGXFLOATS:  convs.append(_ngxFloat)
+            else:                     convs.append(_S)
+            x = m.end()
+        pattern.append(re.escape(lf[x:]))
+        if 'time_local' not in names:
+            raise ValueError('log_format has no $time_local: {}'.format(repr(lf)))
+        if len(set(names)) != len(names):
+            raise ValueError('log_format repeats a variable: {}'.format(repr(lf)))
+        return _ns(logformat=lf, 
+                   regex=re.compile(''.join(pattern) + '$'), 
+                   regexb=re.compile((''.join(pattern) + '$').encode(ENCODING)), 
+                   regexm=re.compile(('^' + ''.join(pattern) + '$').encode(ENCODING), re.M), 
+                   names=tuple(names), 
+                   fields=tuple(zip(names, convs)),
+                   it=names.index('time_local'),
+                   keys=set(ORECKEYS + tuple(names) + ('time_utc', )),
+                   dumps=compileOrecSchema(set(ORECKEYS + tuple(names) + ('time_utc', ))))
+    except Exception as E:
+        errmsg = '{}: {} @ {}'.format(me, E, _m.tblineno())
+        DOSQUAWK(errmsg)
+        raise
+
+#
+# parseFormatLogrec
+#
+def parseFormatLogrec(lf, logrec):
+    """Parse a logrec into chunks with a compiled log_format."""
+    m = lf.regex.match(fixAccessQuirks(logrec))
+    if not m:
+        errmsg = 'not log_format: {}'.format(logrec)
+        return 1, errmsg, None
+    return 0, 'OK', m.groups()
+
+#
+# genFORMATorec
+#
+def genFORMATorec(lf, chunks, ae, el, sl, srcid, subid, decorated=False):
+    """Generate an ACCESS orec from log_format chunks."""
+    me = 'genFORMATorec'
+    rc, rm, orec, vrec = -1, '???', None, None
+    try:
+
+        if len(chunks) != len(lf.fields):
+            errmsg = 'expecting {} fields but got {} from: {}'.format(len(lf.fields), len(chunks), repr('|'.join(chunks)))
+            rc, rm = 1, errmsg
+            return rc, rm, orec, vrec
+
+        time_local = '[' + chunks[lf.it] + ']'      # As genACCESSorec: '[03/Aug/2015:12:53:06 -0700]'
+        time_utc = CLFlocstr2utcut(ae, time_local)
+        logdict = {
+            '_ip'             : None,               # Will be filled in by logging server.
+            '_ts'             : tsBDstr(time_utc),  # '1234567890.    ' format.
+            '_id'             : srcid,
+            '_si'             : subid,
+            '_el'             : el,                 # Raw, base error_level.
+            '_sl'             : sl,                 # Raw, base sub_level.
+            'ae'              : ae,                 # Access or Error.
+        }
+        for (name, conv), chk in zip(lf.fields, chunks):
+            logdict[name] = conv(chk)
+        logdict['time_local'] = time_local
+        logdict['time_utc'] = time_utc
+
+        rc, rm = 0, 'OK'        
+        ldj = lf.dumps(logdict)
+        if decorated:
+            # Prepend a copy of the timetamp (for sorting).
+            orec = '{}|{}|{}'.format(logdict['_ts'], ae, orecText(ldj))  
+        else:
+            orec = ldj
+
+        if TXTLEN and (TXTLEN > 0):
+            vrec = ('{}|{}|{}|{}|{}'.format(ip15(logdict.get('remote_addr') or '999.999.999.999'), 
+                    str(el), str(sl), ae, str(logdict.get('request'))))[:TXTLEN]
+            vrec = vrec
+
+        return rc, rm, orec, vrec
+
+    except Exception as E:
+        errmsg = '{}: {} @ {}'.format(me, E, _m.tblineno())
+        DOSQUAWK(errmsg)
+        raise
+    finally:
+        1/1
+
 #
 # genERRORorec
 #
+# nginx error log "key: value" pairs, mapped to ERROR orec field names.
+_EKEYS = {'client:'  : 'remote_addr', 
+          'server:'  : 'server', 
+          'request:' : 'request', 
+          'upstream:': 'upstream', 
+          'host:'    : 'host', 
+          'referrer:': 'http_referer'}
+ERRORKEYS = ORECKEYS + ('time_local', 'time_utc', 'status', 'pid', 'tid', 'connection', 'stuff') + \
+            tuple(_EKEYS.values())
+dumpsERROR = compileJSONSchema(ERRORKEYS)
 def genERRORorec(chunks, ae, el, sl, srcid, subid, decorated=False):
     """Generate an ERROR orec from chunks."""
 
-    def chunkspop0():
-        try:    return chunks.pop(0)
-        except: return None
-
     me = 'genERRORorec'
     rc, rm, orec, vrec = -1, '???', None, None
     try:
 
-        original_chunks = copy.copy(chunks)     # !DEBUG!
-
         if False and len(chunks) < 3:           # !DEBUG!
             errmsg = 'no chunks!'
             _m.beep(1)
@@ -786,7 +1292,7 @@ def genERRORorec(chunks, ae, el, sl, srcid, subid, decorated=False):
             1/1
 
         try:
-            time_local = chunkspop0() + ' ' + chunkspop0()
+            time_local = chunks[0] + ' ' + chunks[1]
             time_utc = CLFlocstr2utcut(ae, time_local)
             time_utc_iso = _dt.ut2iso(time_utc)
         except Exception as E:
@@ -796,7 +1302,7 @@ def genERRORorec(chunks, ae, el, sl, srcid, subid, decorated=False):
             1/1
             return rc, rm, orec, vrec
 
-        status = chunkspop0()
+        status = chunks[2] if len(chunks) > 2 else None
         if status not in ('[warn]', '[error]'):  
             errmsg = 'unexpected status: ' + repr(status)
             pass        # POR
@@ -805,24 +1311,26 @@ def genERRORorec(chunks, ae, el, sl, srcid, subid, decorated=False):
             pass
 
         # The remaining chunks are inconsistently formatted "stuff".
-        stuff = '\t'.join(chunks)
-
-        # But try to find "remote_addr", "request", "server".
-        remote_addr, request, server = '999.999.999.999', '', ''
-        z = copy.copy(chunks)
-        while z:
-            y = z.pop(0)
-            if y == 'client:':
-                remote_addr = z.pop(0).rstrip(',')
+        rest = chunks[3:]
+        stuff = '\t'.join(rest)
+
+        # But, in one pass, pull out pid#tid, *connection and
+        # the "key: value" pairs (see _EKEYS).
+        fields = dict.fromkeys(_EKEYS.values())
+        pid = tid = connection = None
+        n = len(rest)
+        for x, y in enumerate(rest):
+            if x == 0 and y.endswith(':') and '#' in y:
+                z = y[:-1].split('#')
+                if len(z) == 2 and z[0].isdigit() and z[1].isdigit():
+                    pid, tid = int(z[0]), int(z[1])
                 continue
-            if y == 'server:':
-                server = z.pop(0).rstrip(',')
+            if x == 1 and y[:1] == '*' and y[1:].isdigit():
+                connection = int(y[1:])
                 continue
-            if y == 'request:':
-                request = z.pop(0).rstrip(',')
-        remote_addr, request, server = remote_addr, request, server
-        if not request:
-            chunks = chunks
+            k = _EKEYS.get(y)
+            if k and x + 1 < n:
+                fields[k] = _S(rest[x+1])
 
         # Skeleton ERROR logdict.
         logdict = {
@@ -836,20 +1344,25 @@ def genERRORorec(chunks, ae, el, sl, srcid, subid, decorated=False):
             'time_local'      : time_local,
             'time_utc'        : time_utc,
             'status'          : status,             # In ('[warn]', '[error]').
+            'pid'             : pid,                # nginx worker pid.
+            'tid'             : tid,                # nginx worker thread id.
+            'connection'      : connection,         # nginx connection serial number.
             'stuff'           : stuff               # Inconsistently formatted stuff. 
         }
+        logdict.update(fields)
 
         rc, rm = 0, 'OK'        
-        ldj = json.dumps(logdict, ensure_ascii=True, sort_keys=True)
+        ldj = dumpsERROR(logdict)
         if decorated:
             # Prepend a copy of the timetamp (for sorting).
-            orec = '{}|{}|{}'.format(logdict['_ts'], ae, ldj)  
+            orec = '{}|{}|{}'.format(logdict['_ts'], ae, orecText(ldj))  
         else:
             orec = ldj
 
         if TXTLEN and (TXTLEN > 0):
             vrec = ('{}|{}|{}|{}|{} {}'\
-                    .format(ip15(remote_addr), str(el), str(sl), ae, server, request))[:TXTLEN]
+                    .format(ip15(fields['remote_addr'] or '999.999.999.999'), str(el), str(sl), ae, 
+                            fields['server'] or '', fields['request'] or ''))[:TXTLEN]
             vrec = vrec
 
         return rc, rm, orec, vrec
@@ -863,6 +1376,45 @@ def genERRORorec(chunks, ae, el, sl, srcid, subid, decorated=False):
             rc, rm, orec, vrec = rc, rm, orec, vrec
         1/1
 
+#
+# checkBinary
+#
+def checkBinary(logrecs=(A0, A2, A4, A6, E0, E2, E4, E6), n=100000):
+    """Round trip logrecs' orecs through binary vs JSON; time and size them."""
+    nbad = 0
+    pairs = []
+    for logrec in logrecs:
+        ae = 'e' if logrec[:1].isdigit() and logrec[4:5] == '/' else 'a'
+        setOrecFormat('json')
+        z = logrec2orec(ae, logrec)
+        setOrecFormat('binary')
+        y = logrec2orec(ae, logrec)
+        if not z or z[0] or not y or y[0]:
+            _sl.info('checkBinary: no orec: {}'.format(logrec[:40]))
+            nbad += 1
+            continue
+        jd = json.loads(z[1])
+        bd, end = loadsBinary(y[1])
+        if bd != jd or end != len(y[1]):
+            _sl.info('checkBinary: mismatch: {} != {}'.format(bd, jd))
+            nbad += 1
+        pairs.append((ae, jd, len(z[1].encode(ENCODING)), len(y[1])))
+    setOrecFormat('json')
+    jsondumps = {'a': dumpsACCESS, 'e': dumpsERROR}
+    bindumps = {'a': compileBinarySchema(ACCESSKEYS), 'e': compileBinarySchema(ERRORKEYS)}
+    logdicts = [(ae, jd) for ae, jd, _, _ in pairs] * (n // max(len(pairs), 1))
+    t0 = time.perf_counter()
+    for ae, jd in logdicts:
+        jsondumps[ae](jd).encode(ENCODING, ERRORS)
+    t1 = time.perf_counter()
+    for ae, jd in logdicts:
+        bindumps[ae](jd)
+    t2 = time.perf_counter()
+    jb, bb = sum(z[2] for z in pairs), sum(z[3] for z in pairs)
+    _sl.info('json: {:.3f}s {:,d} bytes  binary: {:.3f}s {:,d} bytes ({:.0%})  ({:,d} recs, {} bad)'
+             .format(t1 - t0, jb, t2 - t1, bb, bb / max(jb, 1), len(logdicts), nbad))
+    return nbad
+
 ####################################################################################################
 
 #
@@ -895,7 +1447,7 @@ def sendLogrec(ae, logrec):
             return
             
         # Parse logrec.
-        rc, rm, chunks = parseLogrec(ae, logrec)
+        rc, rm, chunks = parseAElogrec(ae, logrec)
         if rc != 0:
             _m.beep(1)
             try:    z = '|'.join(chunks)
@@ -904,65 +1456,1718 @@ def sendLogrec(ae, logrec):
             _yl.error(ae, errmsg)
             return
 
-        # ACCESS log?
-        if   ae == 'a':
-            rc, rm, orec, vrec = genACCESSorec(chunks, 'a', AEL, 'a', SRCID, SUBID)
-            if rc != 0:
-                _m.beep(1)
-                try:    z = '|'.join(chunks)
-                except: z = ''
-                errmsg = '{}: gen_access_orec: {}:, {}, {}'.format(me, rc, rm, z)
-                _yl.error(ae, errmsg)
-                return
-            
-        # ERROR log?
-        elif ae == 'e':
-            rc, rm, orec, vrec = genERRORorec(chunks, 'e', EEL, 'e', SRCID, SUBID)
-            if rc != 0:
-                _m.beep(1)
-                try:    z = '|'.join(chunks)
-                except: z = ''
-                errmsg = '{}: parse_gen_error_orec: {}:, {}, {}'.format(me, rc, rm, z)
-                _yl.error(ae, errmsg)
-                return
+        sendChunks(ae, chunks)
 
+    except Exception as E:
+        errmsg = '{}: {} @ {}'.format(me, E, _m.tblineno())
+        DOSQUAWK(errmsg)
+        raise
+    finally:
+        1/1
+
+#
+# sendChunks
+#
+def sendChunks(ae, chunks):
+    """Send parsed chunks: gen a/e orec, output to xlog/file."""
+    me = 'sendChunks'
+    try:
+
+        errmsg, orec, vrec = chunks2orec(ae, chunks)
+        if errmsg:
+            _m.beep(1)
+            _yl.error(ae, errmsg)
+            return
+
+        outputOrec(ae, orec, vrec)
+
+    except Exception as E:
+        errmsg = '{}: {} @ {}'.format(me, E, _m.tblineno())
+        DOSQUAWK(errmsg)
+        raise
+    finally:
+        1/1
+
+#
+# parseAElogrec
+#
+def parseAElogrec(ae, logrec):
+    """Parse an (unblank, stripped) a/e logrec into chunks."""
+    if ae == 'a' and ACCESSLF:
+        return parseFormatLogrec(ACCESSLF, logrec)
+    elif ae == 'a':
+        return parseAccessLogrec(ae, logrec)
+    else:
+        return parseLogrec(ae, logrec)
+
+#
+# chunks2orec
+#
+def chunks2orec(ae, chunks):
+    """Gen an a/e orec from chunks.  Returns errmsg (None if OK), orec, vrec."""
+    me = 'chunks2orec'
+
+    # ACCESS log?
+    if   ae == 'a':
+        if ACCESSLF:
+            rc, rm, orec, vrec = genFORMATorec(ACCESSLF, chunks, 'a', AEL, 'a', SRCID, SUBID)
         else:
-            raise ValueError('export: bad _ae: ' + repr(ae))
+            rc, rm, orec, vrec = genACCESSorec(chunks, 'a', AEL, 'a', SRCID, SUBID)
+        what = 'gen_access_orec'
+
+    # ERROR log?
+    elif ae == 'e':
+        rc, rm, orec, vrec = genERRORorec(chunks, 'e', EEL, 'e', SRCID, SUBID)
+        what = 'parse_gen_error_orec'
+
+    else:
+        raise ValueError('export: bad _ae: ' + repr(ae))
+
+    if rc != 0:
+        try:    z = '|'.join(chunks)
+        except: z = ''
+        errmsg = '{}: {}: {}:, {}, {}'.format(me, what, rc, rm, z)
+        return errmsg, None, None
+    return None, orec, vrec
+
+#
+# XLOG batching
+#
+# Rather than one OXLOG.send per orec, encoded orecs are packed into
+# frames:  b'XLB1', seq, n, payload length ('>III'), then the payload,
+# n records each prefixed by its length ('>I').  A frame is sent when 
+# it reaches BATCHBYTES or its first record is BATCHAGE seconds old 
+# (checked on each add, and by poll, which watcherThread calls at least
+# every BATCHAGE seconds while it waits out INTERVAL).  TXBUCKET paces
+# records (before batching).  poll reports acknowledgements (TRACINGS),
+# a heuristic rather than a protocol:  there are no server acks, so 
+# frames count as acked, oldest first, while len(unacked) exceeds 
+# len(OXLOG.txbacklog).  A reconnect that clears txbacklog (dropping 
+# what it held) therefore acks every outstanding frame.  The xlog server
+# must deframe (deframeBatch).  BATCHBYTES 0 -> a send per orec, as 
+# before.
+#
+BATCHBYTES = 0              # Frame size to send at (0 -> no batching).
+BATCHAGE = 1.0              # Most seconds a record waits in a frame.
+BATCHER = None              # XLOGBatcher in front of OXLOG.
 
-        # TCP/IP?
-        if OXLOG:
+_BATCHMAGIC = b'XLB1'
+_BATCHHDR = struct.Struct('>III')
+_BATCHLEN = struct.Struct('>I')
+
+#
+# Compressed frames (WIRE 'zlib').
+#
+# Each frame is a complete zlib stream of its own, primed with ZDICT 
+# (key names, common values), so it decodes alone:  OXLOG (XLogTxRx) 
+# queues sends and may reconnect without our knowing, and a frame that
+# continued an earlier frame's stream would be undecodable on the new
+# connection.  (A frame is BATCHBYTES of records, so what's lost is only
+# compression against earlier frames.)  A batcher's first frame, and 
+# the first after a failed send or reset(), is preceded by a hello, 
+# b'XLH1' + JSON {"wire": "zlib", "zdict": crc32(ZDICT)}, which tells 
+# the server the wire and checks its ZDICT.  Compressed frames are 
+# b'XLZ1', seq, n, compressed payload length, then the compressed 
+# payload (n records, as in XLB1).  XLOGInflater is the receiving side:
+# a hello it can't honour (wire, ZDICT) is an error; an XLZ1 frame 
+# before any hello (a reconnect we didn't see) is decoded with its own
+# ZDICT, which a later hello confirms.
+#
+WIRE = 'raw'                # 'raw' or 'zlib' (INI 'wire').
+ZLEVEL = 6                  # zlib compression level.
+_ZMAGIC = b'XLZ1'
+_HELLOMAGIC = b'XLH1'
+ZDICT = (' '.join('"{}": '.format(k) for k in sorted(set(ACCESSKEYS + ERRORKEYS))) +
+         ' "_ip": null, "_el": "0", "ae": "e", "status": "-", "remote_user": "-",'
+         ' "http_referer": "-", "ae": "a", "status": "200", "_sl": "a",'
+         ' "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko)'
+         ' Chrome/ Safari/537.36", "Mozilla/5.0 (iPhone; CPU iPhone OS like Mac OS X)'
+         ' AppleWebKit/605.1.15 (KHTML, like Gecko) Version/ Mobile/ Safari/604.1",'
+         ' "request": "GET / HTTP/1.1", "request": "GET /').encode('ascii')
+
+class XLOGBatcher():
+
+    def __init__(self, oxlog, maxbytes=BATCHBYTES, maxage=BATCHAGE, wire=None):
+        self.oxlog = oxlog
+        self.maxbytes = maxbytes
+        self.maxage = maxage
+        self.wire = wire or WIRE
+        self.helloed = False            # Hello sent (WIRE 'zlib').
+        self.lock = threading.Lock()
+        self.parts = []
+        self.nbytes = 0
+        self.t0 = None                  # When the frame's first record came.
+        self.seq = 0                    # Last frame sent.
+        self.unacked = collections.deque()  # (seq, n, nbytes, t) of sent frames.
+        self.acked = 0                  # Frames ...
+        self.ackedrecs = 0              # ... and records acknowledged.
+        self.kept = False               # A raising add kept bs (for the next flush).
+
+    def add(self, bs):
+        """Add an encoded orec, sending the frame if it's due.  On a raise, 
+        kept says whether bs is still here (a failed flush keeps the frame)."""
+        with self.lock:
+            self.kept = True                    # Appended before any flush.
+            if self.t0 is None:
+                self.t0 = time.time()
+            self.parts.append(_BATCHLEN.pack(len(bs)))
+            self.parts.append(bs)
+            self.nbytes += _BATCHLEN.size + len(bs)
+            if self.nbytes >= self.maxbytes or time.time() - self.t0 >= self.maxage:
+                self._flush()
+
+    def flush(self):
+        """Send the current frame, if any."""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.parts:
+            return
+        # A failed send keeps the frame's records, for the next flush.
+        seq = self.seq + 1
+        n = len(self.parts) // 2
+        payload = b''.join(self.parts)
+        try:
+            if self.wire == 'zlib':
+                if not self.helloed:
+                    hello = {'wire': 'zlib', 'zdict': binascii.crc32(ZDICT)}
+                    self.oxlog.send(_HELLOMAGIC + json.dumps(hello, sort_keys=True).encode('ascii'))
+                    self.helloed = True
+                z = zlib.compressobj(ZLEVEL, zdict=ZDICT)
+                payload = z.compress(payload) + z.flush()
+                self.oxlog.send(_ZMAGIC + _BATCHHDR.pack(seq, n, len(payload)) + payload)
+            else:
+                self.oxlog.send(_BATCHMAGIC + _BATCHHDR.pack(seq, n, len(payload)) + payload)
+        except:
+            self.helloed = False                # Maybe a new connection next: re-hello.
+            raise
+        self.seq = seq
+        self.parts, self.nbytes, self.t0 = [], 0, None
+        self.unacked.append((self.seq, n, len(payload), time.time()))
+
+    def reset(self):
+        """A new connection: the next frame is hello'd."""
+        with self.lock:
+            self.helloed = False
+
+    def poll(self):
+        """Send an aged frame, collect acknowledgements.  Returns frames acked."""
+        with self.lock:
+            if self.t0 is not None and time.time() - self.t0 >= self.maxage:
+                self._flush()
+            try:    backlog = len(self.oxlog.txbacklog)
+            except: backlog = 0
+            nacked = 0
+            while len(self.unacked) > backlog:
+                seq, n, nbytes, t = self.unacked.popleft()
+                self.acked += 1
+                self.ackedrecs += n
+                nacked += 1
+                OXLOGDRAIN.notify()
+                if TRACINGS:
+                    _yl.info(None, 'batch {} acked: {} recs, {} bytes, {:.3f}s'.format(
+                                    seq, n, nbytes, time.time() - t))
+            return nacked
+
+def deframeBatch(frame):
+    """The records (list of bytes) of a batch frame.  Returns seq, records."""
+    if frame[:4] != _BATCHMAGIC:
+        raise ValueError('not a batch frame')
+    seq, n, plen = _BATCHHDR.unpack_from(frame, 4)
+    x, end = 4 + _BATCHHDR.size, 4 + _BATCHHDR.size + plen
+    if end != len(frame):
+        raise ValueError('batch {}: bad length'.format(seq))
+    recs = []
+    while x < end:
+        (z,) = _BATCHLEN.unpack_from(frame, x)
+        x += _BATCHLEN.size
+        recs.append(frame[x:x+z])
+        x += z
+    if len(recs) != n or x != end:
+        raise ValueError('batch {}: bad records'.format(seq))
+    return seq, recs
+
+class XLOGInflater():
+    """A connection's receiving side: frames (XLH1, XLZ1, XLB1) -> records."""
+
+    def __init__(self):
+        self.hello = None               # The last hello (None -> none yet).
+
+    def frame(self, frame):
+        """Returns seq, records (None, [] for a hello)."""
+        magic = frame[:4]
+        if magic == _HELLOMAGIC:
+            hello = json.loads(frame[4:].decode('ascii'))
+            if hello.get('wire') != 'zlib' or hello.get('zdict') != binascii.crc32(ZDICT):
+                raise ValueError('unsupported hello: {}'.format(hello))
+            self.hello = hello
+            return None, []
+        if magic == _ZMAGIC:
+            # Self-contained:  no hello needed (yet) to decode it.
+            seq, n, plen = _BATCHHDR.unpack_from(frame, 4)
+            z = zlib.decompressobj(zdict=ZDICT)
+            payload = z.decompress(frame[4 + _BATCHHDR.size:])
+            if not z.eof:
+                raise ValueError('batch {}: truncated compressed frame'.format(seq))
+            frame = _BATCHMAGIC + _BATCHHDR.pack(seq, n, len(payload)) + payload
+        return deframeBatch(frame)
+
+#
+# TXBUCKET
+#
+# Token buckets, records/s (TXRECS) and bytes/s (TXBYTES), shared by
+# everything that goes through oxlogSend (access, error, heartbeat).
+# Each holds up to TXBURST seconds of its rate, so an idle link lets a
+# post-roll burst out at full speed, and only a sustained excess is held
+# to the rates.  A send takes 1 record and len(bs) bytes, sleeping out 
+# any shortfall (an over-sized record leaves the bytes bucket in debt).
+# fill() is each bucket's level (0..1); it's in heartbeats as tx_fill.
+# A rate of 0 is unlimited.  TXRATE (the old fixed spacing) -> TXRECS.
+#
+TXRECS = 0                  # Records per second (0 -> no limit).
+TXBYTES = 0                 # Bytes per second (0 -> no limit).
+TXBURST = 5.0               # Seconds of rate that can go at once.
+TXBUCKET = None
+
+class TokenBucket():
+
+    def __init__(self, recs=None, nbytes=None, burst=None):
+        self.lock = threading.Lock()
+        self.rates = (recs or 0, nbytes or 0)
+        burst = TXBURST if burst is None else burst
+        self.caps = tuple(max(r * burst, 1) for r in self.rates)
+        self.tokens = list(self.caps)   # Start full.
+        self.t = time.monotonic()
+        self.waited = 0.0               # Seconds slept for tokens.
+
+    def _refill(self):
+        t = time.monotonic()
+        dt, self.t = t - self.t, t
+        for x in (0, 1):
+            if self.rates[x]:
+                self.tokens[x] = min(self.caps[x], self.tokens[x] + dt * self.rates[x])
+
+    def take(self, nrecs, nbytes):
+        """Take tokens for nrecs records of nbytes, waiting as needed."""
+        with self.lock:
+            # Reserve:  a shortfall is debt, which later takers wait out too
+            # (so the streams still queue up), but not behind this lock.
+            self._refill()
+            wait = 0.0
+            for x, n in ((0, nrecs), (1, nbytes)):
+                if self.rates[x]:
+                    self.tokens[x] -= n
+                    if self.tokens[x] < 0:
+                        wait = max(wait, -self.tokens[x] / self.rates[x])
+            self.waited += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def fill(self):
+        """{'recs': 0..1, 'bytes': 0..1} (None for no limit)."""
+        with self.lock:
+            self._refill()
+            return {k: (round(max(self.tokens[x], 0) / self.caps[x], 3) if self.rates[x] else None)
+                    for x, k in ((0, 'recs'), (1, 'bytes'))}
+
+def oxlogSend(bs):
+    """Send encoded orec(s) to OXLOG, via SPOOL if there is one."""
+    if SPOOL:
+        SPOOL.send(bs)
+    else:
+        oxlogSendNow(bs)
+
+def oxlogSendNow(bs, paced=False):
+    """Send encoded orec(s) to OXLOG, batched if BATCHER.  paced -> TXBUCKET already taken."""
+    if TXBUCKET and not paced:
+        TXBUCKET.take(1, len(bs))
+    if BATCHER:
+        BATCHER.add(bs)
+    else:
+        OXLOG.send(bs)
+
+#
+# SPOOL
+#
+# A write-ahead spool of encoded orecs, in WORKPATH/SPOOLDIR segment
+# files (seg-########, up to SPOOLSEG bytes), each record '>II' (length,
+# crc32) + the orec.  Once OXLOG.send fails, or OXLOG.txbacklog exceeds
+# SPOOLBACKLOG, orecs are appended to the spool instead of sent, and 
+# keep going there (order) until a replay thread has caught up:  it 
+# sends up to SPOOLREPLAY spooled orecs, waits for OXLOG to drain them
+# (the acknowledgement), then records the position in SPOOLDIR/Acked 
+# (atomically) and deletes whole segments behind it.  A failed send or
+# drain -> the batch is replayed again later (at least once), from the
+# last Acked.  Appends are flushed at once and fsync'd at most every 
+# SPOOLSYNC seconds (and by sync, e.g. before a file is moved to 
+# SENTPATH, see waitOXLOGflush), so parsing and file progress never 
+# wait on the network.  A spool left by a previous run is replayed
+# (a torn last record is cut off).  SPOOLDIR '' -> no spool (the 
+# default; INI 'spool', e.g. 'spool', turns it on).  A record a failed
+# send left in BATCHER (sent with its next flush) isn't also spooled.
+# A batch is acked once OXLOG has drained, as waitOXLOGflush judges it
+# (txbacklog <= 1:  XLogTxRx may hold one entry).
+#
+SPOOLDIR = ''               # In WORKPATH ('' -> no spool).
+SPOOLSEG = 64 * 1024 * 1024 # Segment file size.
+SPOOLBACKLOG = 1000         # OXLOG.txbacklog length that diverts to the spool.
+SPOOLREPLAY = 10000         # Orecs per replay acknowledgement.
+SPOOLSYNC = 1.0             # Most seconds between fsyncs.
+SPOOLRETRY = 5.0            # Seconds between replays of a down link.
+SPOOL = None
+
+_SPOOLREC = struct.Struct('>II')
+
+class Spool():
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.stop = False
+        self.spooled = 0                        # Orecs spooled ...
+        self.replayed = 0                       # ... and replayed (acked).
+        self.down = False                       # Last send failed.
+        try:
+            with open(os.path.join(path, 'Acked'), 'r') as f:
+                self.rseg, self.roff = [int(z) for z in f.read().split()]
+        except:
+            self.rseg, self.roff = 0, 0
+        segs = self.segments()
+        self.wseg = segs[-1] if segs else self.rseg
+        self.wf = open(self.segpfn(self.wseg), 'ab')
+        # Cut off a torn last record.
+        good = self.scan(self.wseg)
+        if good < self.wf.tell():
+            self.wf.truncate(good)
+            self.wf.seek(good)
+        if segs and segs[0] > self.rseg:
+            self.rseg, self.roff = segs[0], 0
+        if self.rseg == self.wseg:
+            self.roff = min(self.roff, good)
+        self.synced = time.time()
+        self.spooling = self.pending()
+        self.replayer = threading.Thread(target=self.replay, name='spool', daemon=True)
+        self.replayer.start()
+
+    def segpfn(self, seg):
+        return os.path.join(self.path, 'seg-{:08d}'.format(seg))
+
+    def segments(self):
+        return sorted(int(fn[4:]) for fn in os.listdir(self.path) 
+                      if fn.startswith('seg-') and fn[4:].isdigit())
+
+    def scan(self, seg):
+        """Offset after the last good record of seg."""
+        x = 0
+        with open(self.segpfn(seg), 'rb') as f:
+            while True:
+                hdr = f.read(_SPOOLREC.size)
+                if len(hdr) < _SPOOLREC.size:
+                    return x
+                n, crc = _SPOOLREC.unpack(hdr)
+                bs = f.read(n)
+                if len(bs) < n or binascii.crc32(bs) != crc:
+                    return x
+                x += _SPOOLREC.size + n
+
+    def pending(self):
+        """Spooled orecs not yet acked?"""
+        return (self.rseg, self.roff) < (self.wseg, self.wf.tell())
+
+    def send(self, bs):
+        """oxlogSend: send bs, or spool it if the link's down or behind."""
+        # Pace before the lock:  replay and sync needn't wait on TXBUCKET.
+        # (Spooled, bs is paced again when it's replayed.)
+        paced = bool(TXBUCKET) and not self.spooling
+        if paced:
+            TXBUCKET.take(1, len(bs))
+        with self.lock:
+            if not self.spooling:
+                try:    backlog = len(OXLOG.txbacklog)
+                except: backlog = 0
+                if backlog <= SPOOLBACKLOG:
+                    try:
+                        oxlogSendNow(bs, paced)
+                        return
+                    except Exception as E:
+                        _yl.warning(None, 'spooling: {}'.format(E))
+                        self.down = True
+                        # Kept by BATCHER (XLOGBatcher or XLOGPool) -> sent with its next flush.
+                        if BATCHER and BATCHER.kept:
+                            self.spooling = True
+                            self.cond.notify_all()
+                            return
+                self.spooling = True
+            self.append(bs)
+            self.cond.notify_all()
+
+    def append(self, bs):
+        if self.wf.tell() >= SPOOLSEG:
+            self.wf.flush()
+            os.fsync(self.wf.fileno())
+            self.wf.close()
+            self.wseg += 1
+            self.wf = open(self.segpfn(self.wseg), 'ab')
+        self.wf.write(_SPOOLREC.pack(len(bs), binascii.crc32(bs)) + bs)
+        self.wf.flush()
+        self.spooled += 1
+        if time.time() - self.synced >= SPOOLSYNC:
+            os.fsync(self.wf.fileno())
+            self.synced = time.time()
+
+    def sync(self):
+        """Spooled orecs to disk."""
+        with self.lock:
+            self.wf.flush()
+            os.fsync(self.wf.fileno())
+            self.synced = time.time()
+
+    def read(self, seg, off, end, n):
+        """Up to n orecs from (seg, off), not past end.  Returns orecs, (seg, off) after them."""
+        orecs = []
+        while len(orecs) < n and (seg, off) < end:
+            with open(self.segpfn(seg), 'rb') as f:
+                f.seek(off)
+                while len(orecs) < n and (seg, off) < end:
+                    hdr = f.read(_SPOOLREC.size)
+                    if len(hdr) < _SPOOLREC.size:
+                        break
+                    z, crc = _SPOOLREC.unpack(hdr)
+                    bs = f.read(z)
+                    if len(bs) < z or binascii.crc32(bs) != crc:
+                        raise ValueError('spool seg {} @ {}: bad record'.format(seg, off))
+                    orecs.append(bs)
+                    off += _SPOOLREC.size + z
+            if (seg, off) < end and len(orecs) < n:
+                seg, off = seg + 1, 0            # On to the next segment.
+        return orecs, (seg, off)
+
+    def ack(self, seg, off):
+        """Orecs before (seg, off) are delivered."""
+        p = os.path.join(self.path, 'Acked')
+        with open(p + '.tmp', 'w') as f:
+            f.write('{} {}\n'.format(seg, off))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(p + '.tmp', p)
+        self.rseg, self.roff = seg, off
+        for z in self.segments():
+            if z < seg:
+                os.remove(self.segpfn(z))
+
+    def replay(self):
+        """Thread:  send spooled orecs, in order, acking as OXLOG drains them."""
+        me = 'Spool.replay'
+        while not self.stop:
+            with self.lock:
+                if not self.pending():
+                    self.spooling = False
+                    self.cond.wait(1)
+                    continue
+                self.wf.flush()
+                end = (self.wseg, self.wf.tell())
             try:
-                rc = OXLOG.send(orec.encode(encoding=ENCODING, errors=ERRORS))
+                orecs, (seg, off) = self.read(self.rseg, self.roff, end, SPOOLREPLAY)
+                for bs in orecs:
+                    oxlogSendNow(bs)
+                if BATCHER:
+                    BATCHER.flush()
+                OXLOGDRAIN.wait(lambda: len(OXLOG.txbacklog))
+                with self.lock:
+                    self.ack(seg, off)
+                    self.replayed += len(orecs)
+                    if self.down:
+                        _yl.info(None, '{}: link up'.format(me))
+                    self.down = False
             except Exception as E:
-                errmsg = '{}: oxlog: {}'.format(me, E)
-                DOSQUAWK(errmsg)
-                raise
+                if not self.down:
+                    _yl.warning(None, '{}: {}'.format(me, E))
+                self.down = True
+                time.sleep(SPOOLRETRY)
+
+    def close(self):
+        self.stop = True
+        with self.lock:
+            self.cond.notify_all()
+        self.replayer.join(SPOOLRETRY + 1)
+        with self.lock:
+            self.wf.flush()
+            os.fsync(self.wf.fileno())
+            self.wf.close()
 
-        # Flatfile?
-        if OFILE:
+#
+# XLOGPool
+#
+# xfile may list several xlog endpoints (host:port,host:port,...).  The
+# pool keeps a persistent connection (XLogTxRx) per endpoint, made on 
+# first use, and tracks each one's health:  a failed send marks it down
+# for POOLRETRY seconds (its connection is dropped, to be remade), and a
+# txbacklog over POOLSLOW marks it slow.  XLOGMODE 'failover' sends to
+# the first healthy endpoint in xfile order; 'hash' spreads sources 
+# (SRCID/SUBID) over the healthy ones by rendezvous hash, so a source 
+# stays on one collector while it's healthy, and only a sick collector's
+# sources move.  Slow endpoints are a last resort, so one slow collector
+# doesn't throttle the whole edge.  Records stranded on a failed 
+# endpoint (batched, unsent) go to the next one.  Batching is per 
+# connection (a compressed stream can't change collectors); the pool
+# stands in for both OXLOG and BATCHER.
+#
+XLOGMODE = 'failover'       # 'failover' or 'hash' (INI 'xlogmode').
+POOLRETRY = 10.0            # Seconds a failed endpoint is left alone.
+POOLSLOW = 1000             # txbacklog length that makes an endpoint slow.
+
+def detectHPs(s):
+    """[(host, port), ...] of a comma separated list, [] unless all are host:port."""
+    hps = []
+    for z in (s or '').split(','):
+        h, p = detectHP(z.strip())
+        if not (h and p):
+            return []
+        hps.append((h, p))
+    return hps
+
+class XLOGEndpoint():
+
+    def __init__(self, hp, factory, batched):
+        self.hp = hp
+        self.factory = factory
+        self.batched = batched
+        self.conn = None
+        self.batcher = None
+        self.downtil = 0                # Down until then.
+        self.fails = 0
+        self.sent = 0
+        self.kept = False               # Last failed send left bs in the batcher.
+
+    def __repr__(self):
+        return '{}:{}'.format(*self.hp)
+
+    def backlog(self):
+        try:    return len(self.conn.txbacklog) if self.conn else 0
+        except: return 0
+
+    def send(self, bs):
+        """Send (or batch) bs.  On a raise, kept says whether the batcher has bs."""
+        self.kept = False
+        if self.conn is None:
+            self.conn = self.factory(self.hp)
+            if self.batched:
+                self.batcher = XLOGBatcher(self.conn, BATCHBYTES or 64 * 1024, BATCHAGE, WIRE)
+        if self.batcher:
             try:
-                OFILE.write(orec + '\n')    # Opened with encoding=ENCODING, errors=ERRORS.
-            except Exception as E:
-                errmsg = '{}: ofile: {}'.format(me, E)
-                DOSQUAWK(errmsg)
+                self.batcher.add(bs)
+            except:
+                self.kept = self.batcher.kept
                 raise
+        else:
+            self.conn.send(bs)
+        self.sent += 1
+
+    def drop(self):
+        """Down: returns the records stranded in its batcher."""
+        recs = []
+        if self.batcher:
+            recs = self.batcher.parts[1::2]
+        try:    self.conn.close()
+        except: pass
+        self.conn = self.batcher = None
+        self.fails += 1
+        self.downtil = time.time() + POOLRETRY
+        return recs
+
+class XLOGPool():
+
+    def __init__(self, hps, mode=None, factory=None, batched=None):
+        if factory is None:
+            factory = lambda hp: XLogTxRx(hp, txrate=0)         # TXBUCKET does the pacing.
+        if batched is None:
+            batched = BATCHBYTES > 0 or WIRE != 'raw'
+        self.mode = mode or XLOGMODE
+        self.endpoints = [XLOGEndpoint(hp, factory, batched) for hp in hps]
+        self.lock = threading.RLock()
+        self.stranded = []              # Records no endpoint would take.
+        self.kept = False               # As XLOGBatcher's:  a raising add never keeps bs.
+
+    @property
+    def txbacklog(self):
+        # Just its len.  Stranded records aren't delivered either.
+        return range(sum(ep.backlog() for ep in self.endpoints) + len(self.stranded))
+
+    def order(self, key):
+        """Endpoints to try, best first."""
+        now = time.time()
+        up = [ep for ep in self.endpoints if now >= ep.downtil]
+        if self.mode == 'hash':
+            key = (key or '{}/{}'.format(SRCID, SUBID)).encode(ENCODING)
+            up.sort(key=lambda ep: binascii.crc32(key + repr(ep).encode('ascii')), reverse=True)
+        return ([ep for ep in up if ep.backlog() <= POOLSLOW] + 
+                [ep for ep in up if ep.backlog() > POOLSLOW])
+
+    def fail(self, ep, E):
+        _yl.warning(None, 'xlog {} down: {}'.format(ep, E))
+        return ep.drop()
+
+    def add(self, bs, key=None):
+        """Send (or batch) bs on the best endpoint."""
+        with self.lock:
+            recs = self.stranded + [bs]
+            self.stranded = []
+            for ep in self.order(key):
+                try:
+                    while recs:
+                        ep.send(recs[0])
+                        recs.pop(0)
+                    return
+                except Exception as E:
+                    # Older (batched) records first; recs[0] unless it's among them.
+                    stranded = self.fail(ep, E)
+                    recs = stranded + (recs[1:] if ep.kept else recs)
+            # Our caller (e.g. SPOOL) has bs (always last; equal records may come before it).
+            self.stranded = recs[:-1] if recs and recs[-1] is bs else recs
+            raise ConnectionError('no xlog endpoint up')
+
+    send = add
+
+    def flush(self):
+        """Send all batches.  Raises if records are left stranded."""
+        with self.lock:
+            for ep in self.endpoints:
+                if ep.batcher:
+                    try:
+                        ep.batcher.flush()
+                    except Exception as E:
+                        self.stranded.extend(self.fail(ep, E))
+            self.resend()
+            for ep in self.endpoints:
+                if ep.batcher and ep.batcher.parts:
+                    try:
+                        ep.batcher.flush()
+                    except Exception as E:
+                        self.stranded.extend(self.fail(ep, E))
+            if self.stranded:
+                raise ConnectionError('{} records stranded, no xlog endpoint up'.format(len(self.stranded)))
+
+    def poll(self):
+        with self.lock:
+            nacked = 0
+            for ep in self.endpoints:
+                if ep.batcher:
+                    try:
+                        nacked += ep.batcher.poll()
+                    except Exception as E:
+                        self.stranded.extend(self.fail(ep, E))
+            self.resend()
+            return nacked
+
+    def resend(self):
+        """Retry the stranded records, in order."""
+        recs, self.stranded = self.stranded, []
+        for x, z in enumerate(recs):
+            try:
+                self.add(z)
+            except:
+                # add stranded what it had before z (older); z on are ours.
+                self.stranded = self.stranded + recs[x:]
+                break
+
+    def reset(self):
+        with self.lock:
+            for ep in self.endpoints:
+                if ep.batcher:
+                    ep.batcher.reset()
 
-        # Screen?
-        if TXTLEN and vrec and (TXTLEN > 0):
-            _yl.extra(ae, vrec)
+    def status(self):
+        """[(endpoint, up, backlog, sent, fails), ...]"""
+        now = time.time()
+        return [(repr(ep), now >= ep.downtil, ep.backlog(), ep.sent, ep.fails) for ep in self.endpoints]
+
+#
+# checkBatching
+#
+def checkBatching(n=1000):
+    """Round trip n records through XLOGBatcher and deframeBatch."""
+    class Sink():
+        def __init__(self):
+            self.frames, self.txbacklog = [], []
+        def send(self, frame):
+            self.frames.append(frame)
+    sink = Sink()
+    b = XLOGBatcher(sink, maxbytes=4096, maxage=60)
+    recs = [orecBytes(dumpsACCESS({'ae': 'a', '_ts': str(x), 'request': 'GET /{} HTTP/1.1'.format(x)})) 
+            for x in range(n)]
+    for z in recs:
+        b.add(z)
+    b.flush()
+    out = []
+    for frame in sink.frames:
+        out.extend(deframeBatch(frame)[1])
+    nacked = b.poll()
+    ok = (out == recs) and (nacked == len(sink.frames)) and (b.ackedrecs == n)
+    _sl.info('checkBatching: {} recs, {} frames, {}'.format(n, len(sink.frames), 'OK' if ok else 'MISMATCH'))
+    return 0 if ok else 1
+
+#
+# benchWire
+#
+def benchWire(pfn=None, n=None):
+    """Loopback: bytes on the wire and CPU per million orecs, per send mode."""
+    import socket
+    if pfn:
+        with (gzip.open(pfn, 'rt', encoding=ENCODING, errors=ERRORS) if pfn.endswith('.gz') else 
+              open(pfn, 'r', encoding=ENCODING, errors=ERRORS)) as f:
+            logrecs = list(itertools.islice(f, n))
+    else:
+        logrecs = [A0, A2, A4, A6] * ((n or 100000) // 4)
+    orecs = []
+    for logrec in logrecs:
+        z = logrec2orec('a', logrec)
+        if z and not z[0]:
+            orecs.append(orecBytes(z[1]))
+    class Link():
+        """A socketpair; the far end counts bytes (and its CPU) in a thread."""
+        def __init__(self):
+            self.a, self.b = socket.socketpair()
+            self.nbytes, self.cpu = 0, 0.0
+            self.rx = threading.Thread(target=self._rx, daemon=True)
+            self.rx.start()
+        def _rx(self):
+            t0 = time.thread_time()
+            while True:
+                bs = self.b.recv(1 << 20)
+                if not bs:
+                    break
+                self.nbytes += len(bs)
+            self.cpu = time.thread_time() - t0
+        def send(self, bs):
+            self.a.sendall(_BATCHLEN.pack(len(bs)) + bs)     # As a message.
+        def close(self):
+            self.a.close()
+            self.rx.join()
+            self.b.close()
+    results = []
+    for mode in ('per-orec', 'batched', 'zlib'):
+        link = Link()
+        link.txbacklog = []
+        c0, t0 = time.process_time(), time.perf_counter()
+        if mode == 'per-orec':
+            for z in orecs:
+                link.send(z)
         else:
-            _sw.iw('.')
+            b = XLOGBatcher(link, maxbytes=64 * 1024, maxage=60, wire='zlib' if mode == 'zlib' else 'raw')
+            for z in orecs:
+                b.add(z)
+            b.flush()
+        c1, t1 = time.process_time(), time.perf_counter()
+        link.close()
+        m = 1e6 / max(len(orecs), 1)
+        results.append((mode, link.nbytes, (c1 - c0 - link.cpu) * m, (t1 - t0) * m))
+    # The receiving side's cost of decompressing.
+    sink = _ns(frames=[], txbacklog=[], send=lambda frame: sink.frames.append(frame))
+    b = XLOGBatcher(sink, maxbytes=64 * 1024, maxage=60, wire='zlib')
+    for z in orecs:
+        b.add(z)
+    b.flush()
+    inf, out = XLOGInflater(), []
+    c0 = time.process_time()
+    for frame in sink.frames:
+        out.extend(inf.frame(frame)[1])
+    rxcpu = (time.process_time() - c0) * 1e6 / max(len(orecs), 1)
+    raw = results[0][1]
+    for mode, nbytes, cpu, wall in results:
+        _sl.info('{:>8s}: {:14,d} bytes on the wire ({:5.1%}), {:6.2f} cpu-s, {:6.2f} s per 1M orecs'
+                 .format(mode, int(nbytes * 1e6 / max(len(orecs), 1)), nbytes / max(raw, 1), cpu, wall))
+    _sl.info('    zlib: {:6.2f} cpu-s per 1M orecs to inflate, {}'
+             .format(rxcpu, 'OK' if out == orecs else 'MISMATCH'))
+    return results
+
+#
+# XLOGStandIn
+#
+# A local, multi-listener stand-in for xlog servers, to try XLOGPool's 
+# failover and throughput offline.  Messages are '>I' length-prefixed
+# (XLOGConn is the matching client); batch frames (XLH1, XLZ1, XLB1) are
+# unpacked per connection, so recs counts records.  stop(port) kills a
+# listener (and its connections); delay slows every message (a slow
+# collector).
+#
+class XLOGConn():
+    """A bare '>I' length-prefixed TCP connection (for XLOGStandIn)."""
+
+    def __init__(self, hp):
+        import socket
+        self.sock = socket.create_connection(hp, timeout=5)
+        self.txbacklog = []
+
+    def send(self, bs):
+        self.sock.sendall(_BATCHLEN.pack(len(bs)) + bs)
+
+    def close(self):
+        self.sock.close()
+
+class XLOGStandIn():
+
+    def __init__(self, ports, delay=0):
+        import socket
+        self.delay = delay
+        self.stats = {}                 # port -> _ns(msgs, recs, nbytes)
+        self.socks = {}                 # port -> (listener, [connections])
+        for port in ports:
+            ls = socket.socket()
+            ls.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            ls.bind(('127.0.0.1', port))
+            ls.listen(8)
+            port = ls.getsockname()[1]
+            self.stats[port] = _ns(msgs=0, recs=0, nbytes=0)
+            self.socks[port] = (ls, [])
+            threading.Thread(target=self._listen, args=(port,), daemon=True).start()
+
+    @property
+    def ports(self):
+        return list(self.stats)
+
+    def _listen(self, port):
+        ls, conns = self.socks[port]
+        while True:
+            try:    cs, _ = ls.accept()
+            except: return
+            conns.append(cs)
+            threading.Thread(target=self._serve, args=(port, cs), daemon=True).start()
+
+    def _serve(self, port, cs):
+        st, inf, buf = self.stats[port], XLOGInflater(), b''
+        while True:
+            try:    bs = cs.recv(1 << 20)
+            except: bs = b''
+            if not bs:
+                return
+            buf += bs
+            while len(buf) >= _BATCHLEN.size:
+                (n,) = _BATCHLEN.unpack_from(buf)
+                if len(buf) < _BATCHLEN.size + n:
+                    break
+                msg, buf = buf[_BATCHLEN.size:_BATCHLEN.size + n], buf[_BATCHLEN.size + n:]
+                if self.delay:
+                    time.sleep(self.delay)
+                st.msgs += 1
+                st.nbytes += n
+                st.recs += len(inf.frame(msg)[1]) if msg[:4] in (_BATCHMAGIC, _ZMAGIC, _HELLOMAGIC) else 1
+
+    def stop(self, port):
+        """Kill port's listener and connections."""
+        import socket
+        ls, conns = self.socks[port]
+        for z in [ls] + conns:
+            try:    z.shutdown(socket.SHUT_RDWR)
+            except: pass
+            z.close()
+
+    def close(self):
+        for port in self.stats:
+            self.stop(port)
 
-        # YDATA.
+#
+# checkXLOGPool
+#
+def checkXLOGPool(n=100000, mode='failover', nports=3):
+    """n orecs through an XLOGPool to an XLOGStandIn, killing the first
+    listener half way.  Returns (records received, n)."""
+    standin = XLOGStandIn([0] * nports)
+    pool = XLOGPool([('127.0.0.1', port) for port in standin.ports], mode, XLOGConn, batched=False)
+    orec = orecBytes(dumpsACCESS({'ae': 'a', '_ts': '0', 'request': 'GET / HTTP/1.1'}))
+    t0 = time.perf_counter()
+    for x in range(n):
+        if x == n // 2:
+            standin.stop(standin.ports[0])
+        try:    pool.add(orec, key=str(x % 8) if mode == 'hash' else None)
+        except: pass
+    pool.flush()
+    t = time.perf_counter() - t0
+    time.sleep(0.5)                                 # Let the stand-in catch up.
+    got = sum(st.recs for st in standin.stats.values())
+    for port, st in standin.stats.items():
+        _sl.info('{:>6d}: {:9,d} recs {:12,d} bytes'.format(port, st.recs, st.nbytes))
+    _sl.info('{}: {:,d} of {:,d} recs received, {:,.0f} recs/s, {}'
+             .format(mode, got, n, n / t, pool.status()))
+    standin.close()
+    return got, n
+
+#
+# checkSpoolPool
+#
+def checkSpoolPool(n=20000, nports=2):
+    """n orecs via SPOOL over a batched XLOGPool to an XLOGStandIn whose
+    listeners all die a third of the way in and come back at two thirds.
+    Returns (records received, n):  at least n (replays may repeat)."""
+    global OXLOG, BATCHER, SPOOL, POOLRETRY, SPOOLRETRY
+    import tempfile
+    saved = OXLOG, BATCHER, SPOOL, POOLRETRY, SPOOLRETRY
+    POOLRETRY, SPOOLRETRY = 0.1, 0.1
+    standin = XLOGStandIn([0] * nports)
+    ports = standin.ports
+    pool = XLOGPool([('127.0.0.1', port) for port in ports], 'failover', XLOGConn, batched=True)
+    OXLOG = BATCHER = pool
+    d = tempfile.mkdtemp()
+    SPOOL = Spool(d)
+    orec = orecBytes(dumpsACCESS({'ae': 'a', '_ts': '0', 'request': 'GET / HTTP/1.1'}))
+    standin2 = None
+    try:
+        for x in range(n):
+            if x == n // 3:
+                for port in ports:
+                    standin.stop(port)
+            if x == 2 * n // 3:
+                standin2 = XLOGStandIn(ports)
+            oxlogSend(orec)
+        t0 = time.time()
+        while SPOOL.pending() and time.time() - t0 < 30:
+            time.sleep(0.1)
+        try:    pool.flush()
+        except: pass
+        time.sleep(0.5)                             # Let the stand-in catch up.
+        got = sum(st.recs for z in (standin, standin2) if z for st in z.stats.values())
+        _sl.info('checkSpoolPool: {:,d} of {:,d} recs received, {:,d} spooled, {:,d} replayed, {}'
+                 .format(got, n, SPOOL.spooled, SPOOL.replayed, 'OK' if got >= n else 'LOST'))
+        return got, n
+    finally:
+        SPOOL.close()
+        shutil.rmtree(d, ignore_errors=True)
+        standin.close()
+        if standin2:
+            standin2.close()
+        OXLOG, BATCHER, SPOOL, POOLRETRY, SPOOLRETRY = saved
+
+#
+# FileSink
+#
+# OFILE (xfile is a path) as a buffered, partitioned file sink.  write()
+# takes orec lines as before, but they're encoded into OFILEBUF sized 
+# buffers, not written singly.  OFILEROTATE 'hour' writes hourly (local)
+# partitions, xfile + '.yyyymmdd-hh', chosen per record (when it's 
+# written, not when the buffer goes out); OFILEMAXMB > 0 also starts a 
+# new part ('.1', '.2', ...) once one's on-disk size (compressed, for 
+# 'gz', so a reopened part measures the same) reaches it; 'none', 0 -> 
+# just xfile, as before.  OFILEZ 'gz' streams through gzip (a reopened
+# partition gets another gzip member; zstd isn't in the stdlib).  The
+# OFILESYNC policy is applied at most every OFILESYNCSECS, at rotation, 
+# at close and by flush() (see waitOXLOGflush):  'none' (buffer only),
+# 'flush' (to the OS) or 'fsync' (to disk).
+#
+OFILEBUF = 1024 * 1024      # Bytes buffered between writes.
+OFILEROTATE = 'none'        # 'none' or 'hour'.
+OFILEMAXMB = 0              # Partition size limit, on disk (0 -> none).
+OFILEZ = ''                 # '' or 'gz'.
+OFILESYNC = 'flush'         # 'none', 'flush' or 'fsync'.
+OFILESYNCSECS = 1.0         # Most seconds between OFILESYNCs.
+
+class FileSink():
+
+    def __init__(self, pfn, rotate=None, maxmb=None, z=None, sync=None, syncsecs=None):
+        self.pfn = pfn
+        self.rotate = OFILEROTATE if rotate is None else rotate
+        self.maxbytes = int((OFILEMAXMB if maxmb is None else maxmb) * 1024 * 1024)
+        self.z = OFILEZ if z is None else z
+        self.policy = OFILESYNC if sync is None else sync
+        self.syncsecs = OFILESYNCSECS if syncsecs is None else syncsecs
+        self.lock = threading.Lock()
+        self.parts, self.nbuf = [], 0
+        self.f = self.raw = None
+        self.partition = self.part = None   # Open file's.
+        self.bufpartition = None            # Buffered records'.
+        self.pname, self.pnext = None, 0    # partitionName, until pnext.
+        self.synced = time.time()
+
+    def partitionName(self):
+        """The partition for a record written now."""
+        if self.rotate == 'hour':
+            t = time.time()
+            if t >= self.pnext:
+                lt = time.localtime(t)
+                self.pname = time.strftime('%Y%m%d-%H', lt)
+                self.pnext = t - (t % 60) - lt.tm_min * 60 + 3600
+            return self.pname
+
+    def _open(self):
+        pfn = self.pfn
+        if self.partition:
+            pfn += '.' + self.partition
+        if self.part:
+            pfn += '.{}'.format(self.part)
+        if self.z == 'gz':
+            pfn += '.gz'
+        self.raw = open(pfn, 'ab')
+        self.f = gzip.GzipFile(fileobj=self.raw, mode='ab') if self.z == 'gz' else self.raw
+
+    def _close(self):
+        if self.f is not self.raw:
+            self.f.close()                  # Ends the gzip member.
+            self.f = self.raw
+        self._sync('fsync' if self.policy == 'fsync' else 'flush')
+        self.raw.close()
+        self.f = self.raw = None
+
+    def _sync(self, policy):
+        if policy in ('flush', 'fsync'):
+            if self.f is not self.raw:
+                self.f.flush()              # Z_SYNC_FLUSH: readable so far.
+            self.raw.flush()
+        if policy == 'fsync':
+            os.fsync(self.raw.fileno())
+        self.synced = time.time()
+
+    def _flush(self):
+        """Buffer -> its partition (rotating as needed)."""
+        if self.parts:
+            partition = self.bufpartition
+            if self.f and partition != self.partition:
+                self._close()
+            if self.f and self.maxbytes and self.raw.tell() >= self.maxbytes:
+                self._close()
+                self.part = (self.part or 0) + 1
+            if partition != self.partition:
+                self.partition, self.part = partition, None
+            if not self.f:
+                self._open()
+                while self.maxbytes and self.raw.tell() >= self.maxbytes:
+                    # Reopened onto a full part.
+                    self._close()
+                    self.part = (self.part or 0) + 1
+                    self._open()
+            bs = b''.join(self.parts)
+            self.parts, self.nbuf = [], 0
+            self.f.write(bs)
+            if self.maxbytes and self.f is not self.raw:
+                self.f.flush()              # So raw.tell() is the on-disk size.
+        if self.f and time.time() - self.synced >= self.syncsecs:
+            self._sync(self.policy)
+
+    def write(self, s):
+        bs = s if s.__class__ is bytes else s.encode(encoding=ENCODING, errors=ERRORS)
+        with self.lock:
+            partition = self.partitionName()
+            if partition != self.bufpartition:
+                if self.parts:
+                    self._flush()           # The previous partition's.
+                self.bufpartition = partition
+            self.parts.append(bs)
+            self.nbuf += len(bs)
+            if self.nbuf >= OFILEBUF or time.time() - self.synced >= self.syncsecs:
+                self._flush()
+
+    def flush(self):
+        """Buffer out, and OFILESYNC it."""
+        with self.lock:
+            self._flush()
+            if self.f:
+                self._sync(self.policy)
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            if self.f:
+                self._close()
+
+#
+# outputOrec
+#
+def outputOrec(ae, orec, vrec):
+    """Output an orec to xlog/file (and screen, ydata)."""
+    me = 'outputOrec'
+
+    # TCP/IP?
+    if OXLOG:
+        try:
+            oxlogSend(orecBytes(orec))
+        except Exception as E:
+            errmsg = '{}: oxlog: {}'.format(me, E)
+            DOSQUAWK(errmsg)
+            raise
+
+    # Flatfile?
+    if OFILE:
+        try:
+            OFILE.write(orec if orec.__class__ is bytes else orec + '\n')
+        except Exception as E:
+            errmsg = '{}: ofile: {}'.format(me, E)
+            DOSQUAWK(errmsg)
+            raise
+
+    # Screen?
+    if TXTLEN and vrec and (TXTLEN > 0):
+        _yl.extra(ae, vrec)
+    else:
+        _sw.iw('.')
+
+    # YDATA (binary orecs only when TRACINGS, as JSON).
+    if orec.__class__ is not bytes:
         _yl._ydata(ae, orec)
+    elif TRACINGS:
+        _yl._ydata(ae, orecText(orec))
+
+#
+# waitOXLOGflush
+#
+# Waits on OXLOGDRAIN, a condition, rather than sleeping out whole 
+# seconds:  notify() (from anything that empties OXLOG.txbacklog, e.g.
+# XLogTxRx's tx thread, or XLOGBatcher.poll) wakes a waiter at once; 
+# short backed-off timeouts (DRAINPOLL, doubling to DRAINPOLLMAX) cover
+# a transmit side that doesn't notify.  OXLOGWAIT is the deadline.  Time
+# spent waiting is kept (stalls, stalled, maxstall, timeouts) and goes
+# out in heartbeats as oxlog_stall.
+#
+OXLOGWAIT = 180             # Seconds to wait for OXLOG to drain (then give up).
+DRAINPOLL = 0.001           # First re-check of an un-notified drain (seconds) ...
+DRAINPOLLMAX = 0.050        # ... doubling to this.
+
+class OXLOGDrain():
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.stalls = 0                 # Waits that had to wait.
+        self.stalled = 0.0              # Their total seconds.
+        self.maxstall = 0.0             # The longest.
+        self.timeouts = 0
+
+    def notify(self):
+        """txbacklog (maybe) shrank."""
+        with self.cond:
+            self.cond.notify_all()
+
+    def wait(self, backlog, deadline=None):
+        """Wait for backlog() <= 1, at most deadline seconds.  Returns seconds waited."""
+        if backlog() <= 1:
+            return 0.0
+        deadline = OXLOGWAIT if deadline is None else deadline
+        t0 = time.time()
+        poll = DRAINPOLL
+        with self.cond:
+            while backlog() > 1:
+                left = deadline - (time.time() - t0)
+                if left <= 0:
+                    self.timeouts += 1
+                    raise RuntimeError('OXLOG flush timeout')
+                self.cond.wait(min(poll, left))
+                poll = min(2 * poll, DRAINPOLLMAX)
+        z = time.time() - t0
+        self.stalls += 1
+        self.stalled += z
+        self.maxstall = max(self.maxstall, z)
+        return z
+
+OXLOGDRAIN = OXLOGDrain()
+
+def waitOXLOGflush(me):
+    """Wait for OXLOG to flush?"""
+    if OFILE:
+        OFILE.flush()                           # FileSink: and OFILESYNC.
+    if SPOOL and SPOOL.spooling:
+        # Safe in the spool is as good as sent.
+        SPOOL.sync()
+        return
+    if WAIT4OXLOG and OXLOG:
+        try:
+            if BATCHER:
+                BATCHER.flush()
+            z = OXLOGDRAIN.wait(lambda: len(OXLOG.txbacklog))
+            if z:
+                _yl.info(None, '{}: OXLOG drained in {:.3f}s'.format(me, z))
+        except Exception as E:
+            errmsg = '{}: {}'.format(me, E)
+            DOSQUAWK(errmsg)
+            raise
 
+#
+# sendLogrecsBytes
+#
+# Bytes-native ingestion of a buffer (bytes, mmap, ...) of logrecs.  Lines
+# are found and matched in place (find and regex pos/endpos, no per-line
+# copies) and only the chunks that reach the orec are decoded.  Lines the
+# fast path can't take (error logs, quirks, no match) are decoded singly
+# and go through sendLogrec.
+#
+BYTESINGEST = True          # Access logs via sendLogrecsBytes, not whole-buffer decodes.
+READCHUNK = 4 * 1024 * 1024 # incrementDynamicFile reads (bytes).
+_ACCESS_REB = re.compile(_ACCESS_RE.pattern.encode('ascii'))
+def sendLogrecsBytes(ae, buf, start=0, end=None):
+    """Send the logrecs in buf[start:end]."""
+    me = 'sendLogrecsBytes'
+    try:
+        sendOrecs(ae, orecsBytes(ae, buf, start, end))
     except Exception as E:
         errmsg = '{}: {} @ {}'.format(me, E, _m.tblineno())
         DOSQUAWK(errmsg)
         raise
+
+def orecsBytes(ae, buf, start=0, end=None):
+    """Yield (errmsg, orec, vrec) for the logrecs in buf[start:end]."""
+    if end is None:
+        end = len(buf)
+    if ae == 'a' and ACCESSBATCH and not TXTLEN:
+        yield from batchOrecs(parseAccessBatch(buf, start, end))
+        return
+    regex = None
+    if ae == 'a':
+        regex = ACCESSLF.regexb if ACCESSLF else _ACCESS_REB
+    pos = start
+    while pos < end:
+        if FWTSTOP:
+            break
+        eol = buf.find(b'\n', pos, end)
+        if eol == -1:
+            eol = end
+        m = None
+        if regex and buf.find(b'  ', pos, eol) == -1:
+            # nginx quirk (see parseLogrec): only a harmless first
+            # 'HTTP/1.0"' (blank before it) stays on the fast path.
+            x = buf.find(b'HTTP/1.0"', pos, eol)
+            if x == -1 or (x > pos and buf[x-1] == 32):
+                m = regex.match(buf, pos, eol)
+        if not m:
+            z = logrec2orec(ae, buf[pos:eol].decode(encoding=ENCODING, errors=ERRORS))
+            if z:
+                yield z
+        elif ACCESSLF:
+            yield chunks2orec(ae, [z.decode(encoding=ENCODING, errors=ERRORS) for z in m.groups()])
+        else:
+            chunks = [z.decode(encoding=ENCODING, errors=ERRORS) for z in m.groups()]
+            # OK to lose a quoted blank (request, referer).
+            if chunks[5] == '" "':
+                chunks[5] = '"_"'
+            if chunks[8] == '" "':
+                chunks[8] = '"_"'
+            yield chunks2orec(ae, chunks)
+        pos = eol + 1
+
+def logrec2orec(ae, logrec):
+    """sendLogrec, less the output: (errmsg, orec, vrec), None if blank."""
+    me = 'sendLogrec'
+    try:    logrec = logrec.strip()
+    except: logrec = None
+    if not logrec:
+        return None
+    rc, rm, chunks = parseAElogrec(ae, logrec)
+    if rc != 0:
+        try:    z = '|'.join(chunks)
+        except: z = ''
+        return '{}: parse_logrec: {}:, {}, {}'.format(me, rc, rm, z), None, None
+    return chunks2orec(ae, chunks)
+
+#
+# parseAccessBatch
+#
+# Columnar parse of a buffer (whole lines) of access logrecs:  one 
+# multi-line regex scan (_ACCESS_REBM, or ACCESSLF.regexm) finds every
+# record's fields, then each column is decoded at once (joined on '\n',
+# decoded, split) and converted in bulk.  status, body_bytes_sent and 
+# time_utc (CLFlocstr2utcut once per distinct time_local) are int64 
+# NumPy arrays (array.array('q') without NumPy); the rest are lists, 
+# their values as in genACCESSorec's logdict.  An ACCESSLF batch has a
+# column per $variable (ints as arrays unless a value is '' or '-').  
+# Lines the scan doesn't take (no match, parseLogrec's quirks) are in
+# bad, (row they come before, line), for the per-line path.  batchOrecs
+# turns a batch into orecs, the same as per-line ones, and is what 
+# orecsBytes (incrementDynamicFile, sendStaticFile) uses for access 
+# logs, unless ACCESSBATCH is off or TXTLEN (screen text) is on.
+#
+ACCESSBATCH = True          # Access logs via parseAccessBatch.
+_ACCESS_REBM = re.compile(rb'^(\S+) (\S+) (\S+) (\[\S+ \S+\]) '
+                          rb'(".*?") (\d+) (\d+) (".*?") (".*")$', re.M)
+ACCESS_STRCOLS = ('_ts', 'remote_addr', 'remote_user', 'time_local', 
+                  'request', 'http_referer', 'http_user_agent')
+ACCESS_NUMCOLS = ('time_utc', 'status', 'body_bytes_sent')
+
+def _decodeColumn(col):
+    """[bytes, ...] -> [str, ...], in one decode (values have no '\n')."""
+    if not col:
+        return []
+    return b'\n'.join(col).decode(encoding=ENCODING, errors=ERRORS).split('\n')
+
+def _intColumn(col):
+    """[b'123', ...] -> int64 array."""
+    if np is not None:
+        return np.array(col, dtype=np.bytes_).astype(np.int64) if col else np.zeros(0, dtype=np.int64)
+    return array.array('q', map(int, col))
+
+def _requestS(request):
+    # As genACCESSorec:  '" "' -> '"_"' -> None.
+    if request in ('', '""', '"_"', '" "'):
+        return
+    return _S(request)
+
+def _refererS(referer):
+    # As genACCESSorec:  '" "' -> '"_"' -> '_'.
+    return '_' if referer == '" "' else _S(referer)
+
+def parseAccessBatch(buf, start=0, end=None):
+    """Parse buf[start:end] (whole lines of access logrecs) into columns."""
+    me = 'parseAccessBatch'
+    try:
+        bs = bytes(buf[start:len(buf) if end is None else end])
+        lf = ACCESSLF
+        regex = lf.regexm if lf else _ACCESS_REBM
+        quirky = b'  ' in bs or b'HTTP/1.0"' in bs
+        rows, bad = [], []
+        if not quirky:
+            rows = regex.findall(bs)
+        nlines = bs.count(b'\n') + (1 if bs and not bs.endswith(b'\n') else 0)
+        if quirky or len(rows) != nlines:
+            # Some lines for the per-line path:  find them.
+            def gap(a, b):
+                for line in bs[a:b].split(b'\n'):
+                    if line.strip():
+                        bad.append((len(rows), line))
+            rows, pos = [], 0
+            for m in regex.finditer(bs):
+                x, y = m.span()
+                gap(pos, x)
+                pos = y + 1
+                if quirky and bs.find(b'  ', x, y) != -1:
+                    bad.append((len(rows), bs[x:y]))
+                    continue
+                if quirky:
+                    # nginx quirk (see parseLogrec): only a harmless first
+                    # 'HTTP/1.0"' (blank before it) stays on the fast path.
+                    z = bs.find(b'HTTP/1.0"', x, y)
+                    if z != -1 and (z == x or bs[z-1] != 32):
+                        bad.append((len(rows), bs[x:y]))
+                        continue
+                rows.append(m.groups())
+            gap(pos, len(bs))
+        cols = list(zip(*rows)) or [()] * (len(lf.names) if lf else 9)
+        batch = _ns(n=len(rows), bad=bad, names=lf.names if lf else ACCESS_STRCOLS + ACCESS_NUMCOLS)
+        if lf:
+            for (name, conv), col in zip(lf.fields, cols):
+                if conv is _ngxInt and b''.join(col).isdigit() and b'' not in col:
+                    setattr(batch, name, _intColumn(col))
+                else:
+                    setattr(batch, name, list(map(conv, _decodeColumn(col))))
+            time_local = ['[' + z + ']' for z in _decodeColumn(cols[lf.it])]
+        else:
+            (remote_addr, ignored, remote_user, time_local, request, 
+                status, body_bytes_sent, http_referer, http_user_agent) = cols
+            batch.remote_addr = _decodeColumn(remote_addr)
+            z = _decodeColumn(remote_user)
+            batch.remote_user = list(map({'-': None}.get, z, z))
+            time_local = _decodeColumn(time_local)
+            batch.request = list(map(_requestS, _decodeColumn(request)))
+            batch.status = _intColumn(status)
+            batch.body_bytes_sent = _intColumn(body_bytes_sent)
+            batch.http_referer = list(map(_refererS, _decodeColumn(http_referer)))
+            batch.http_user_agent = list(map(_S, _decodeColumn(http_user_agent)))
+        # One time conversion per distinct second.
+        utcs = {z: CLFlocstr2utcut('a', z) for z in set(time_local)}
+        tss = {z: tsBDstr(u) for z, u in utcs.items()}
+        batch.time_local = time_local
+        batch.time_utc = _intColumn([]) if not time_local else (
+                         np.array(list(map(utcs.__getitem__, time_local)), dtype=np.int64) if np is not None else
+                         array.array('q', map(utcs.__getitem__, time_local)))
+        batch._ts = list(map(tss.__getitem__, time_local))
+        return batch
+    except Exception as E:
+        errmsg = '{}: {} @ {}'.format(me, E, _m.tblineno())
+        DOSQUAWK(errmsg)
+        raise
+
+def batchOrecs(batch):
+    """Yield (errmsg, orec, vrec) for a parseAccessBatch batch, its bad lines in place."""
+    lf = ACCESSLF
+    head = {'_ip': None, '_id': SRCID, '_si': SUBID, '_el': AEL, '_sl': 'a', 'ae': 'a'}
+    if lf:
+        names = lf.names + ('time_utc', '_ts')     # time_local is '[...]', as genFORMATorec's.
+        dumps = lf.dumps
+    else:
+        names = ACCESS_STRCOLS + ACCESS_NUMCOLS
+        dumps = dumpsACCESS
+    cols = [getattr(batch, z) for z in names]
+    cols = [z.tolist() if hasattr(z, 'tolist') else z for z in cols]     # Python ints, for the orec.
+    bad, b = batch.bad, 0
+    for x, row in enumerate(zip(*cols)):
+        if FWTSTOP:
+            return
+        while b < len(bad) and bad[b][0] == x:
+            z = logrec2orec('a', bad[b][1].decode(encoding=ENCODING, errors=ERRORS))
+            if z:
+                yield z
+            b += 1
+        logdict = dict(head)
+        logdict.update(zip(names, row))
+        yield None, dumps(logdict), None
+    for x, line in bad[b:]:
+        if FWTSTOP:
+            return
+        z = logrec2orec('a', line.decode(encoding=ENCODING, errors=ERRORS))
+        if z:
+            yield z
+
+#
+# checkAccessBatch
+#
+def checkAccessBatch(logrecs=(A0, A2, A4, A6)):
+    """Check parseAccessBatch's columns and orecs against parseAccessLogrec's."""
+    buf = '\n'.join(z.strip() for z in logrecs).encode(encoding=ENCODING, errors=ERRORS)
+    batch = parseAccessBatch(buf)
+    nbad = 0
+    for x, logrec in enumerate(logrecs):
+        rc, rm, chunks = parseAccessLogrec('a', logrec.strip())
+        rc, rm, orec, vrec = genACCESSorec(chunks, 'a', AEL, 'a', SRCID, SUBID)
+        logdict = json.loads(orecText(orec))
+        got = {k: getattr(batch, k)[x] for k in ACCESS_STRCOLS + ACCESS_NUMCOLS}
+        got = {k: int(v) if k in ACCESS_NUMCOLS else v for k, v in got.items()}
+        if any(logdict[k] != v for k, v in got.items()):
+            nbad += 1
+            _yl.error(None, 'access batch mismatch: {} != {}'.format(got, logdict))
+    orecs = [z[1] for z in batchOrecs(batch)]
+    if orecs != [logrec2orec('a', z)[1] for z in logrecs]:
+        nbad += 1
+        _yl.error(None, 'access batch orecs mismatch')
+    _sl.info('checkAccessBatch: {} recs, {} ({})'.format(batch.n, 'OK' if not nbad else 'MISMATCH', 
+                                                       'numpy' if np is not None else 'array'))
+    return nbad
+
+def sendOrecs(ae, results):
+    """Output (errmsg, orec, vrec)'s, logging the errmsgs."""
+    for errmsg, orec, vrec in results:
+        if errmsg:
+            _m.beep(1)
+            _yl.error(ae, errmsg)
+        else:
+            outputOrec(ae, orec, vrec)
+
+#
+# Pipeline
+#
+# Reader, parsers and sender overlapped:  the caller reads pieces (whole
+# lines) and puts them, PIPEWORKERS threads parse and serialize them 
+# (orecsBytes), and a sender thread outputs each piece's orecs, in put
+# order, then calls the piece's done() (crc, .logx offsets, ...), so
+# progress only advances over sent records.  At most PIPEDEPTH pieces 
+# wait for the sender: put blocks beyond that (backpressure), so a slow
+# xlog slows reading rather than growing memory.  A piece cut short by
+# FWTSTOP doesn't get done().  PIPEWORKERS 0 -> serial, as before.
+#
+PIPEWORKERS = 2             # Parser threads (0 -> no pipeline).
+PIPEDEPTH = 4               # Pieces (<= READCHUNK each) ahead of the sender.
+
+class Pipeline():
+
+    def __init__(self, ae, workers=None, depth=None):
+        self.ae = ae
+        self.pool = concurrent.futures.ThreadPoolExecutor(workers or PIPEWORKERS, 
+                                                          thread_name_prefix='parser')
+        self.q = queue.Queue(depth or PIPEDEPTH)
+        self.error = None
+        self.sender = threading.Thread(target=self._send, name='sender', daemon=True)
+        self.sender.start()
+
+    def put(self, buf, start=0, end=None, done=None):
+        """Queue the logrecs in buf[start:end]; done() once they're sent."""
+        if self.error:
+            raise self.error
+        fut = self.pool.submit(lambda: list(orecsBytes(self.ae, buf, start, end)))
+        self.q.put((fut, done))
+
+    def _send(self):
+        while True:
+            z = self.q.get()
+            if z is None:
+                return
+            fut, done = z
+            if self.error or FWTSTOP:
+                fut.cancel()                    # Just drain.
+                continue
+            try:
+                sendOrecs(self.ae, fut.result())
+                if done and not FWTSTOP:
+                    done()
+            except Exception as E:
+                self.error = E
+
+    def close(self):
+        """Wait for all that's been put to be sent."""
+        self.q.put(None)
+        self.sender.join()
+        self.pool.shutdown(wait=True)
+        if self.error:
+            raise self.error
+
+#
+# Memory-mapped (.1) files.
+#
+# A rolled .1 is crc-verified and its tail sent from one read-only 
+# mapping, a READCHUNK window at a time, without copying into Python
+# buffers.  Finished windows are handed back to the kernel (where
+# madvise is available) so RSS stays low on multi-GB files.
+#
+MMAP1S = True               # Map .1 files (sendWORKPATH1s) rather than read them.
+_MADV_DONTNEED = getattr(mmap, 'MADV_DONTNEED', None)
+
+def openMapped(pfn):
+    """Read-only mapping of pfn (None if empty)."""
+    with open(pfn, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def dropMapped(mm, start, end):
+    """Let the kernel drop mm[start:end]'s pages from our RSS."""
+    if _MADV_DONTNEED is None or end <= start:
+        return
+    z = start - start % mmap.PAGESIZE
+    try:    mm.madvise(_MADV_DONTNEED, z, end - z)
+    except: pass
+
+def crc32Mapped(mm, start, end, crc=0):
+    """crc32 of mm[start:end], continuing crc."""
+    mv = memoryview(mm)
+    try:
+        x = start
+        while x < end:
+            y = min(x + READCHUNK, end)
+            crc = binascii.crc32(mv[x:y], crc)
+            dropMapped(mm, x, y)
+            x = y
     finally:
-        1/1
+        mv.release()                # Else mm.close() fails.
+    return crc
+
+def crc32File(f, start, end, crc=0):
+    """crc32 of an open file's [start, end), continuing crc."""
+    f.seek(start)
+    x = start
+    while x < end:
+        bs = f.read(min(READCHUNK, end - x))
+        if not bs:
+            break
+        crc = binascii.crc32(bs, crc)
+        x += len(bs)
+    return crc
+
+#
+# .logx crc checkpoints.
+#
+# Besides the running crc of all sent bytes, .logx data keeps a list
+# of (offset, running crc) checkpoints, about every CKPTBYTES, at line 
+# boundaries.  Verifying a rolled .1 then only crc's the tail after the
+# last checkpoint.  On a mismatch, checkpoints are binary searched for
+# the last good one (each probe crc's one segment, assuming that a
+# file goes bad from some point on), and sending resumes from there.
+#
+CKPTBYTES = 16 * 1024 * 1024
+
+def ckptLogxData(lxd, off):
+    """Add a checkpoint at off (lxd.crc is the crc through off) if due."""
+    ckpts = getattr(lxd, 'ckpts', None)
+    if ckpts is None:
+        ckpts = lxd.ckpts = []
+    if off - (ckpts[-1][0] if ckpts else 0) >= CKPTBYTES:
+        ckpts.append((off, lxd.crc))
+
+def verifyLogxData(lxd, size, crcf):
+    """Return the (sent, crc) of lxd that a file of size bytes still matches."""
+    # crcf(start, end, crc) -> the file's crc32 over [start, end), continuing crc.
+    ckpts = [(0, 0)] + [z for z in getattr(lxd, 'ckpts', []) if z[0] <= min(lxd.sent, size)]
+    # The tail after the last checkpoint.
+    off, crc = ckpts[-1]
+    if lxd.sent <= size and crcf(off, lxd.sent, crc) == lxd.crc:
+        return lxd.sent, lxd.crc
+    # Last good checkpoint.  ckpts[0] is good by definition.
+    lo, hi = 0, len(ckpts) - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        (a, ac), (b, bc) = ckpts[mid-1], ckpts[mid]
+        if crcf(a, b, ac) == bc:
+            lo = mid
+        else:
+            hi = mid - 1
+    return ckpts[lo]
 
+#
+# readGzBlocks
+#
+# Rather than gzip.open line iteration, large compressed reads go through
+# zlib.decompressobj and come out as decompressed blocks of whole lines
+# (for sendLogrecsBytes).  Concatenated (multi-member) .gz files, and
+# trailing zero padding, are handled as gzip does.
+#
+GZBLOCK = 1024 * 1024       # Compressed bytes per read.
+
+def readGzBlocks(src, blksize=GZBLOCK):
+    """Yield bytes blocks of whole lines from a .gz file."""
+    with open(src, 'rb') as f:
+        d, inmember, carry = None, False, b''
+        while True:
+            cbs = f.read(blksize)
+            if not cbs:
+                break
+            while cbs:
+                if not inmember:
+                    if not cbs.strip(b'\0'):
+                        break                   # Padding.
+                    d, inmember = zlib.decompressobj(16 + zlib.MAX_WBITS), True
+                bs = d.decompress(cbs)
+                if d.eof:
+                    cbs, inmember = d.unused_data, False
+                else:
+                    cbs = b''
+                if not bs:
+                    continue
+                if carry:
+                    bs = carry + bs
+                x = bs.rfind(b'\n') + 1
+                carry = bs[x:]
+                if x:
+                    yield bs if x == len(bs) else bs[:x]
+        if inmember:
+            raise EOFError('compressed file ended before the end-of-stream marker was reached: {}'.format(src))
+        if carry:
+            yield carry
+
+def readPlainBlocks(src, blksize=READCHUNK):
+    """Yield bytes blocks of whole lines from an uncompressed file."""
+    with open(src, 'rb') as f:
+        carry = b''
+        while True:
+            bs = f.read(blksize)
+            if not bs:
+                break
+            if carry:
+                bs = carry + bs
+            x = bs.rfind(b'\n') + 1
+            carry = bs[x:]
+            if x:
+                yield bs if x == len(bs) else bs[:x]
+        if carry:
+            yield carry
+
+#
+# benchGzReader
+#
+def benchGzReader(pfn):
+    """Time gzip.open line iteration against readGzBlocks on a .gz log."""
+    t0 = time.perf_counter()
+    n0 = nb0 = 0
+    with gzip.open(pfn, 'r') as f:
+        for logrec in f:
+            logrec = logrec.decode(encoding=ENCODING, errors=ERRORS)
+            n0 += 1
+            nb0 += len(logrec)
+    t1 = time.perf_counter()
+    n1 = nb1 = 0
+    for bs in readGzBlocks(pfn):
+        z = bs.decode(encoding=ENCODING, errors=ERRORS)
+        logrecs = z.split('\n')
+        if not logrecs[-1]:
+            logrecs.pop()
+        n1 += len(logrecs)
+        nb1 += len(z)
+    t2 = time.perf_counter()
+    msg = 'gzip.open: {:.3f}s  readGzBlocks: {:.3f}s  x{:.2f}  ({:,d} lines, {:,d} chars{})'\
+          .format(t1 - t0, t2 - t1, (t1 - t0) / max(t2 - t1, 1e-9), n0, nb0, 
+                  '' if (n0, nb0) == (n1, nb1) else ', MISMATCH {:,d} {:,d}'.format(n1, nb1))
+    _sl.info(msg)
+    return (n0, nb0) == (n1, nb1)
 
 #
 # Send a file (either type 1 or 2) via pfn.
@@ -981,14 +3186,29 @@ def sendStaticFile(ae, ydf_sfx, src):
         elif  '-error.log'  in src:  ae = 'e' 
         else: raise ValueError('{}: funny filename'.format(me)) 
         1/1
-        if src.endswith('.gz'): f = gzip.open(src, 'r')
-        else:                   f = open(src, 'r')
-        for x, logrec in enumerate(f):
-            if FWTSTOP:
-                break
-            if isinstance(logrec, bytes):
-                logrec = logrec.decode(encoding=ENCODING, errors=ERRORS)
-            sendLogrec(ae, logrec)
+        if src.endswith('.gz') and BYTESINGEST and PIPEWORKERS > 0:
+            pipe = Pipeline(ae)
+            try:
+                for bs in readGzBlocks(src):
+                    if FWTSTOP:
+                        break
+                    pipe.put(bs)
+            finally:
+                pipe.close()
+        elif src.endswith('.gz') and BYTESINGEST:
+            for bs in readGzBlocks(src):
+                if FWTSTOP:
+                    break
+                sendLogrecsBytes(ae, bs)
+        else:
+            if src.endswith('.gz'): f = gzip.open(src, 'r')
+            else:                   f = open(src, 'r')
+            for x, logrec in enumerate(f):
+                if FWTSTOP:
+                    break
+                if isinstance(logrec, bytes):
+                    logrec = logrec.decode(encoding=ENCODING, errors=ERRORS)
+                sendLogrec(ae, logrec)
         1/1
         _yl.warning(ae, '{} sent    {}'.format(_dt.ut2iso(_dt.locut()), fn), d=True)    
         _yl._flush()
@@ -1007,31 +3227,112 @@ def sendStaticFile(ae, ydf_sfx, src):
         except: pass
         _yl.ydataclose()
         # Wait for OXLOG to flush?
-        if WAIT4OXLOG and OXLOG:
-            nsw = 0
-            try:
-                while len(OXLOG.txbacklog) > 1:
-                    _sw.iw('|')
-                    time.sleep(1)
-                    nsw += 1
-                    if nsw > 180:                        # !MAGIC!  Give up after three minutes.
-                        raise RuntimeError('OXLOG flush timeout')
-                _sw.nl()
-            except Exception as E:
-                errmsg = '{}: {}'.format(me, E)
-                DOSQUAWK(errmsg)
-                raise
-            pass
+        waitOXLOGflush(me)
         1/1
 
+#
+# Parallel static (.gz) files.
+#
+# With GZWORKERS > 1, a WORKPATH backlog of .gz files is decompressed 
+# (readGzBlocks) by the parent and its blocks parsed into orecs by a 
+# process pool, at most GZPENDING blocks ahead of the sender, so memory
+# is bounded by blocks, not by files.  The parent outputs the orecs in 
+# filename (prefix) and block order, and moves a file to SENTPATH only 
+# once OXLOG has flushed its records.  The pool's processes come from a
+# forkserver (spawn on Windows), not forked from this (threaded) process.
+#
+GZWORKERS = 0               # > 1 -> process pool for WORKPATH .gz backlogs.
+GZPENDING = 2               # Blocks in flight per worker.
+
+def _initStaticWorker(cfg):
+    """Process pool initializer: the parent's settings."""
+    global ACCESSLF, _yl
+    globals().update(cfg)
+    ACCESSLF = None
+    setOrecFormat(ORECFORMAT)
+    ACCESSLF = compileLogFormat(LOGFORMAT) if LOGFORMAT else None
+    if '_yl' not in globals():                  # Spawned, not forked.
+        _yl = YLOGGER(_sl)
+
+def parseStaticBlock(ae, bs):
+    """Parse a block (whole lines) into [(errmsg, orec, vrec), ...]."""
+    return list(orecsBytes(ae, bs))
+
+def sendStaticFilesPooled(fis):
+    """Send WORKPATH static files, parsed in parallel, in filename order."""
+    me = 'sendStaticFilesPooled'
+    cfg = {'SRCID': SRCID, 'SUBID': SUBID, 'AEL': AEL, 'EEL': EEL, 'TXTLEN': TXTLEN, 
+           'LOGFORMAT': LOGFORMAT, 'ENCODING': ENCODING, 'ERRORS': ERRORS, 'ORECFORMAT': ORECFORMAT}
+    import multiprocessing
+    ctx = multiprocessing.get_context('spawn' if gWIN else 'forkserver')
+    pool = concurrent.futures.ProcessPoolExecutor(GZWORKERS, mp_context=ctx, 
+                                                  initializer=_initStaticWorker, initargs=(cfg, ))
+    pending = collections.deque()
+    try:
+        def blocks():
+            """(fi, src, future) per block, then (fi, src, None) per file."""
+            for fi in sorted(fis, key=lambda z: z.filename):
+                src = os.path.join(WORKPATH, fi.filename)
+                if '.logx.' in src:
+                    # .gz'd *.logx files are uninteresting.
+                    removeFile(src)
+                    continue
+                for bs in (readGzBlocks(src) if src.endswith('.gz') else readPlainBlocks(src)):
+                    yield fi, src, pool.submit(parseStaticBlock, fi.ae, bs)
+                yield fi, src, None
+        todo = blocks()
+        def submit():
+            while sum(1 for z in pending if z[2]) < GZWORKERS * GZPENDING:
+                z = next(todo, None)
+                if z is None:
+                    return
+                pending.append(z)
+        submit()
+        cur, nsent = None, 0
+        while pending and not FWTSTOP:
+            fi, src, fut = pending.popleft()
+            ae = fi.ae
+            if cur != src:
+                cur = src
+                _yl.ydataopen(ae, '-GZ-{}'.format(fi.filename))
+                _yl.warning(ae, '{} sending {}'.format(_dt.ut2iso(_dt.locut()), fi.filename), d=True)
+            if fut:
+                results = fut.result()
+                submit()
+                nsent += len(results)
+                sendOrecs(ae, results)
+                del results
+                continue
+            submit()
+            _sw.nl()
+            # Acknowledged?
+            waitOXLOGflush(me)
+            if FWTSTOP:
+                break
+            moveFile(src, os.path.join(SENTPATH, fi.filename))
+            _yl.warning(ae, '{} sent    {} ({:,d} parsed)'.format(_dt.ut2iso(_dt.locut()), fi.filename, nsent), d=True)    
+            _yl._flush()
+            _yl.ydataclose()
+            cur, nsent = None, 0
+    except Exception as E:
+        errmsg = '{}: {} @ {}'.format(me, E, _m.tblineno())
+        DOSQUAWK(errmsg)
+        raise
+    finally:
+        for z in pending:
+            if z[2]:
+                z[2].cancel()
+        pool.shutdown(wait=True)
+
 #
 # Incrementally send a dynamic file's new stuff.
 #
-def incrementDynamicFile(ae, fi, lxd=None):
-    """Send new content from a dynamic file."""
+def incrementDynamicFile(ae, fi, lxd=None, mm=None):
+    """Send new content from a dynamic file (or from its mapping, mm)."""
     global FWTSTOP
     me = 'incrementDynamicFile({})'.format(fi.filename)
     nbs = 0
+    pipe = None
     try:
 
         if lxd:  lxdsent = lxd.sent
@@ -1052,42 +3353,115 @@ def incrementDynamicFile(ae, fi, lxd=None):
         1/1
         # Dynamic files must be text. 
         # Seek from SOF to the start of new data.
-        # Read the file to its advertised length.
-        # Convert the bytes to str and split by lines.
+        # Read, in READCHUNK pieces, to the file's advertised length.
+        # Send complete lines only, carrying a partial line into the 
+        # next piece, so memory stays flat whatever the backlog.
+        # A .log's last line may still be being written: it's left for
+        # the next increment.  A .1's last line is complete.
+        # A mapped (.1) file is read in place instead, see sendWORKPATH1s.
+        # With PIPEWORKERS, pieces are parsed and sent by a Pipeline, and
+        # crc, checkpoints and nbs follow the sender (done).
         pfn = os.path.normpath(location2path(fi.location) + '/' + fi.filename)
-        with open(pfn, 'rb') as f:
-            if lxdsent > 0:
-                1/1
-                _yl.warning(ae, 'skipping {:,d} bytes'.format(lxdsent), d=True)
-                f.seek(lxd.sent)
-                1/1
-            _yl.warning(ae, 'reading {:,d} bytes'.format(btr), d=True)
-            bs = f.read(btr)
+        final = (fi.filetype != 0)
+        pipe = Pipeline(fi.ae) if (BYTESINGEST and PIPEWORKERS > 0) else None
+        def sentMapped(x, y):
+            nonlocal nbs
             if lxd:
-                lxd.crc = binascii.crc32(bs, lxd.crc)
-            for x, logrec in enumerate(bs.decode(encoding=ENCODING, errors=ERRORS).split('\n')):
-                1/1
+                lxd.crc = crc32Mapped(mm, x, y, lxd.crc)
+            dropMapped(mm, x, y)
+            nbs += y - x
+            if lxd:
+                ckptLogxData(lxd, y)
+        def sentRead(bs, x):
+            nonlocal nbs
+            # Only complete lines are crc'd and counted as sent.
+            if lxd:
+                lxd.crc = binascii.crc32(memoryview(bs)[:x], lxd.crc)
+            nbs += x
+            if lxd:
+                ckptLogxData(lxd, lxdsent + nbs)
+        if mm is not None:
+            _yl.warning(ae, 'mapped {:,d} bytes'.format(btr), d=True)
+            x, end = lxdsent, min(fi.size, len(mm))
+            while x < end:
                 if FWTSTOP:
                     break
-                sendLogrec(fi.ae, logrec)
+                y = min(x + READCHUNK, end)
+                if y < end:
+                    # Whole lines, but at least one.
+                    y = (mm.rfind(b'\n', x, y) + 1) or (mm.find(b'\n', y, end) + 1) or end
+                if pipe:
+                    pipe.put(mm, x, y, functools.partial(sentMapped, x, y))
+                elif BYTESINGEST:
+                    sendLogrecsBytes(fi.ae, mm, x, y)
+                    sentMapped(x, y)
+                else:
+                    for logrec in mm[x:y].decode(encoding=ENCODING, errors=ERRORS).split('\n'):
+                        if FWTSTOP:
+                            break
+                        sendLogrec(fi.ae, logrec)
+                    sentMapped(x, y)
+                x = y
+        else:
+            with open(pfn, 'rb') as f:
+                if lxdsent > 0:
+                    1/1
+                    _yl.warning(ae, 'skipping {:,d} bytes'.format(lxdsent), d=True)
+                    f.seek(lxd.sent)
+                    1/1
+                _yl.warning(ae, 'reading {:,d} bytes'.format(btr), d=True)
+                left, carry = btr, b''
+                while left > 0:
+                    if FWTSTOP:
+                        break
+                    bs = f.read(min(READCHUNK, left))
+                    if not bs:
+                        break
+                    left -= len(bs)
+                    if carry:
+                        bs = carry + bs
+                    if final and left == 0:
+                        x = len(bs)
+                    else:
+                        x = bs.rfind(b'\n') + 1
+                    carry = bs[x:]
+                    if not x:
+                        continue
+                    if pipe:
+                        pipe.put(bs, 0, x, functools.partial(sentRead, bs, x))
+                    elif BYTESINGEST:
+                        sendLogrecsBytes(fi.ae, bs, 0, x)
+                        sentRead(bs, x)
+                    else:
+                        for logrec in bs[:x].decode(encoding=ENCODING, errors=ERRORS).split('\n'):
+                            1/1
+                            if FWTSTOP:
+                                break
+                            sendLogrec(fi.ae, logrec)
+                            1/1
+                        sentRead(bs, x)
                 1/1
-            nbs = len(bs)
+                if carry:
+                    _yl.warning(ae, 'holding {:,d} byte partial line'.format(len(carry)), d=True)
+        if pipe:
+            pipe, z = None, pipe
+            z.close()                           # All sent (nbs final).
+
+        # Update logdata with fi values.
+        if lxd:
             1/1
-            # Update logdata with fi values.
-            if lxd:
-                1/1
-                assert (lxdsent + nbs) == fi.size
-                1/1
-                lxd.modified = fi.modified
-                lxd.sent = fi.size          # All was sent.
-                lxd.size = fi.size
-                1/1
-            else:
-                1/1
+            assert (lxdsent + nbs) <= fi.size
             1/1
+            lxd.modified = fi.modified
+            lxd.sent = lxdsent + nbs        # Through the last complete line.
+            lxd.size = fi.size
+            1/1
+        else:
+            1/1
+        1/1
 
         1/1
-        _yl.warning(ae, '{} sent    [{:,d} .. {:,d}) from {}'.format(_dt.ut2iso(_dt.locut()), lxdsent, fi.size, fi.filename), d=True)
+        _yl.warning(ae, '{} sent    [{:,d} .. {:,d}) from {}'.format(_dt.ut2iso(_dt.locut()), lxdsent, lxdsent + nbs, fi.filename), d=True)
         1/1
         return nbs
 
@@ -1105,25 +3479,13 @@ def incrementDynamicFile(ae, fi, lxd=None):
         raise
     finally:
         1/1
+        if pipe:
+            try:    pipe.close()
+            except: pass
         # End dots.
         _sw.nl()
         # Wait for OXLOG to flush?
-        if WAIT4OXLOG and OXLOG:
-            1/1
-            nsw = 0
-            try:
-                while len(OXLOG.txbacklog) > 1:
-                    _sw.iw('|')
-                    time.sleep(1)
-                    nsw += 1
-                    if nsw > 180:                        # !MAGIC!  Give up after three minutes.
-                        raise RuntimeError('OXLOG flush timeout')
-                _sw.nl()
-            except Exception as E:
-                errmsg = '{}: {}'.format(me, E)
-                DOSQUAWK(errmsg)
-                raise
-            1/1
+        waitOXLOGflush(me)
         1/1
 
 #
@@ -1150,16 +3512,263 @@ def dumpFI(sl, fi, pfx=''):
 # The auxilliary '.logx.' files are not counted, and they don't
 # get a prefix.
 # !MAGIC! The filename prefix is 6 digits (leading zeros) + '-'.
+# The last prefix used is kept in WORKPATH/SEQPFX_FN, updated atomically
+# (write, fsync, replace), so a move doesn't scan the ever growing 
+# SENTPATH.  The directories (and SENTPATH's bundle manifests) are only
+# scanned when that file is missing or unreadable.
 #
+SEQPFX_FN = 'SeqPfx'        # Stored in WORKPATH.
+
 def nextWORKSENTfnpfx():
-    maxpfx = None
-    for fn in itertools.chain(os.listdir(WORKPATH), os.listdir(SENTPATH)):
-        pfx = fn[:6]
-        if '.log.' in fn and (not maxpfx or pfx > maxpfx):
-            maxpfx = pfx
-    if not maxpfx:
-        maxpfx = '000000'
-    return '{:06d}-'.format(int(maxpfx) + 1)
+    p = os.path.join(WORKPATH, SEQPFX_FN)
+    try:
+        with open(p, 'r') as f:
+            lastpfx = int(f.read().strip())
+    except:
+        maxpfx = None
+        for fn in itertools.chain(os.listdir(WORKPATH), os.listdir(SENTPATH), bundledFilenames()):
+            pfx = fn[:6]
+            if '.log.' in fn and (not maxpfx or pfx > maxpfx):
+                maxpfx = pfx
+        if not maxpfx:
+            maxpfx = '000000'
+        lastpfx = int(maxpfx)
+        _yl.info(None, '{} rebuilt: {:06d}'.format(SEQPFX_FN, lastpfx))
+    pfx = lastpfx + 1
+    tmp = p + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write('{:06d}\n'.format(pfx))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, p)
+    return '{:06d}-'.format(pfx)
+
+#
+# SENTPATH compaction
+#
+# Sent .1 and .gz files are packed, by their (local) mtime day, into 
+# SENTPATH/sent-yyyy-mm-dd.tar bundles: .gz's as they are, .1's gzip'd
+# (member name + '.gz').  Each bundle has a small JSON manifest beside
+# it (sent-yyyy-mm-dd.json: name, member, size, mtime of every file),
+# so a bundle needn't be opened to see what's in it.  Only days before
+# today are compacted, and only files settled for a cycle (mtime and 
+# ctime INTERVAL old, none left in WORKPATH):  a cross-filesystem move
+# is a copy, then an unlink.  Stragglers for an already bundled day go
+# into a new part, sent-yyyy-mm-dd.N.tar (N = 1, 2, ...), rather than a
+# rewrite of the day's tar; the day's one manifest says which part 
+# ('bundle') has each file.  Bundles (all parts) older than RETAINDAYS 
+# are deleted (0 -> kept forever).
+# watcherThread starts compactSENTPATH in its own thread, at most every
+# COMPACTHOURS, and doesn't wait for it.
+#
+COMPACTHOURS = 6            # Hours between SENTPATH compactions (0 -> none).
+RETAINDAYS = 0              # Days of bundles to keep (0 -> all).
+BUNDLE_PFX = 'sent-'        # SENTPATH/sent-yyyy-mm-dd[.N].tar & .json
+
+COMPACTOR = None            # The compactSENTPATH thread.
+COMPACTED = 0               # Time of its last start.
+
+def bundleDay(fn):
+    """'yyyy-mm-dd' of a bundle or manifest filename, else None."""
+    if fn.startswith(BUNDLE_PFX) and fn.endswith(('.tar', '.json')):
+        day = fn[len(BUNDLE_PFX):].split('.')[0]
+        if len(day) == 10:
+            return day
+
+def getManifest(day):
+    """Manifest (list of dicts) of day's bundle ([] if none)."""
+    p = os.path.join(SENTPATH, BUNDLE_PFX + day + '.json')
+    try:
+        with open(p, 'r') as f:
+            return json.load(f)['files']
+    except FileNotFoundError:
+        return []
+
+def bundledFilenames():
+    """Filenames in all of SENTPATH's manifests."""
+    for fn in os.listdir(SENTPATH):
+        if bundleDay(fn) and fn.endswith('.json'):
+            for z in getManifest(bundleDay(fn)):
+                yield z['name']
+
+def replaceFile(tmp, p):
+    """fsync tmp and os.replace it onto p."""
+    with open(tmp, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, p)
+
+def bundleFiles(day, fns):
+    """Add SENTPATH's fns to day's bundle, then remove them."""
+    me = 'bundleFiles({})'.format(day)
+    pj = os.path.join(SENTPATH, BUNDLE_PFX + day + '.json')
+    manifest = getManifest(day)
+    # A new part: the first name no manifest entry has (an unlisted one
+    # is left over from a crash, and gets overwritten).
+    parts = set(z.get('bundle', BUNDLE_PFX + day + '.tar') for z in manifest)
+    n = 0
+    while BUNDLE_PFX + day + ('.{}'.format(n) if n else '') + '.tar' in parts:
+        n += 1
+    bundle = BUNDLE_PFX + day + ('.{}'.format(n) if n else '') + '.tar'
+    pt = os.path.join(SENTPATH, bundle)
+    tmpt, tmpj, tmpz = pt + '.tmp', pj + '.tmp', os.path.join(SENTPATH, BUNDLE_PFX + 'gz.tmp')
+    try:
+        done = set(z['name'] for z in manifest)
+        todo = [fn for fn in fns if fn not in done]
+        if todo:
+            with tarfile.open(tmpt, 'w') as tar:
+                for fn in todo:
+                    if FWTSTOP:
+                        break
+                    src = os.path.join(SENTPATH, fn)
+                    st = os.stat(src)
+                    if fn.endswith('.gz'):
+                        member = fn
+                        tar.add(src, arcname=member)
+                    else:
+                        # Re-compress .1's.
+                        member = fn + '.gz'
+                        with open(src, 'rb') as fi, gzip.open(tmpz, 'wb') as fo:
+                            shutil.copyfileobj(fi, fo, READCHUNK)
+                        ti = tar.gettarinfo(tmpz, arcname=member)
+                        ti.mtime = st.st_mtime
+                        with open(tmpz, 'rb') as f:
+                            tar.addfile(ti, f)
+                        os.remove(tmpz)
+                    manifest.append({'name': fn, 'member': member, 'bundle': bundle,
+                                     'size': st.st_size, 'mtime': st.st_mtime})
+            with open(tmpj, 'w') as f:
+                json.dump({'day': day, 'files': manifest}, f, indent=1)
+            # The part, then the manifest.  A crash between the two 
+            # just re-bundles todo (they're still in SENTPATH).
+            replaceFile(tmpt, pt)
+            replaceFile(tmpj, pj)
+            done = set(z['name'] for z in manifest)
+        # Bundled -> gone.
+        for fn in fns:
+            if fn in done:
+                os.remove(os.path.join(SENTPATH, fn))
+        return len(todo)
+    except Exception as E:
+        errmsg = '{}: {} @ {}'.format(me, E, _m.tblineno())
+        DOSQUAWK(errmsg)
+        raise
+    finally:
+        for z in (tmpt, tmpj, tmpz):
+            try:    os.remove(z)
+            except: pass
+
+def compactSENTPATH():
+    """Bundle SENTPATH's sent files by day and apply RETAINDAYS."""
+    me = 'compactSENTPATH'
+    try:
+        today = time.strftime('%Y-%m-%d')
+        days = collections.defaultdict(list)
+        for fn in os.listdir(SENTPATH):
+            if '.log.' not in fn or not fn.endswith(('.1', '.gz')):
+                continue
+            try:
+                st = os.stat(os.path.join(SENTPATH, fn))
+            except OSError:
+                continue
+            if time.time() - max(st.st_mtime, st.st_ctime) < INTERVAL:
+                continue                        # Maybe still being moved in.
+            if os.path.exists(os.path.join(WORKPATH, fn)):
+                continue                        # Copied, not yet unlinked.
+            day = time.strftime('%Y-%m-%d', time.localtime(st.st_mtime))
+            if day < today:
+                days[day].append(fn)
+        for day in sorted(days):
+            if FWTSTOP:
+                return
+            n = bundleFiles(day, sorted(days[day]))
+            _yl.info(None, '{}: {} +{} bundled'.format(me, day, n))
+        if RETAINDAYS > 0:
+            oldest = time.strftime('%Y-%m-%d', time.localtime(time.time() - RETAINDAYS * 86400))
+            for fn in os.listdir(SENTPATH):
+                day = bundleDay(fn)
+                if day and day < oldest:
+                    os.remove(os.path.join(SENTPATH, fn))
+                    _yl.info(None, '{}: {} expired'.format(me, fn))
+    except Exception as E:
+        # Not fatal: the files stay where they are, for next time.
+        errmsg = '{}: {} @ {}'.format(me, E, _m.tblineno())
+        _yl.error(None, errmsg)
+
+def startCompaction():
+    """Start compactSENTPATH in the background, if it's due."""
+    global COMPACTOR, COMPACTED
+    if COMPACTHOURS <= 0 or (COMPACTOR and COMPACTOR.is_alive()):
+        return
+    if time.time() - COMPACTED < COMPACTHOURS * 3600:
+        return
+    COMPACTED = time.time()
+    COMPACTOR = threading.Thread(target=compactSENTPATH, name='compactor', daemon=True)
+    COMPACTOR.start()
+
+#
+# Inotify
+#
+# Linux inotify (via ctypes) on WATCHPATH, so that watcherThread wakes
+# as soon as nginx appends to, creates or rolls a log, rather than 
+# sleeping out INTERVAL.  INTERVAL remains the longest sleep (heartbeats,
+# roll checks).  Events for our own files (.logx, RollState, ...) are 
+# ignored.  No inotify (Windows, old libc, ...) -> INTERVAL polling.
+#
+INOTIFY = True              # Wake watcherThread on WATCHPATH events (Linux).
+MININTERVAL = 0.5           # Least seconds between event driven watcher cycles.
+
+class Inotify():
+
+    IN_MODIFY   = 0x00000002
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE   = 0x00000100
+    IN_CLOEXEC  = 0o2000000
+    IN_NONBLOCK = 0o0004000
+
+    def __init__(self, path):
+        self.fd = None
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        wd = libc.inotify_add_watch(fd, os.fsencode(path), 
+                                    self.IN_MODIFY | self.IN_MOVED_TO | self.IN_CREATE)
+        if wd < 0:
+            os.close(fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed: {}'.format(path))
+        self.fd = fd
+
+    def wait(self, timeout):
+        """Wait up to timeout secs for a log file event.  True if one came."""
+        end = time.time() + timeout
+        while not FWTSTOP:
+            w = end - time.time()
+            if w <= 0:
+                break
+            r, _, _ = select.select([self.fd], [], [], min(w, 1))
+            if r and self._drain():
+                return True
+        return False
+
+    def _drain(self):
+        """Read pending events.  True if any is for a watched log file."""
+        try:    
+            bs = os.read(self.fd, 64 * 1024)
+        except BlockingIOError: 
+            return False
+        hit, x = False, 0
+        while x + 16 <= len(bs):
+            wd, mask, cookie, n = struct.unpack_from('iIII', bs, x)
+            fn = bs[x+16:x+16+n].rstrip(b'\0').decode(errors='replace')
+            x += 16 + n
+            if fn == FORCEROLL_FN or any(doFilename(ft, fn) for ft in (0, 1, 2)):
+                hit = True
+        return hit
+
+    def close(self):
+        try:    os.close(self.fd)
+        except: pass
+        self.fd = None
 
 #
 # watcherThread
@@ -1169,7 +3778,7 @@ FWTSTOP = False     # To signal a thread stop.
 FWTSTOPPED = False  # To acknowledge a thread stop.
 def watcherThread():                                                # !WT! 
     """A thread to watch WATCHPATH for files to process."""
-    global FWTRUNNING, FWTSTOP, FWTSTOPPED
+    global FWTRUNNING, FWTSTOP, FWTSTOPPED, SNAPSHOT
 
     #
     # sendHeartbeat
@@ -1192,19 +3801,21 @@ def watcherThread():                                                # !WT!
                         '_sl'             : 'h',                # Heartbeat.
                         'ae'              : 'h',                # Access or Error or Heartbeat.
                         'dt_utc'          : uuiosfs,    
-                        'dt_loc'          : uliosfs
+                        'dt_loc'          : uliosfs,
+                        'oxlog_stall'     : round(OXLOGDRAIN.stalled, 3),   # Seconds waiting for OXLOG to drain.
+                        'tx_fill'         : TXBUCKET.fill() if TXBUCKET else None
                     }
-                    orec = json.dumps(logdict, ensure_ascii=True, sort_keys=True) 
+                    orec = dumpsHEARTBEAT(logdict)
                     if OXLOG:
                         try:
-                            rc = OXLOG.send(orec.encode(encoding=ENCODING, errors=ERRORS))
+                            oxlogSend(orecBytes(orec))
                         except Exception as E:
                             errmsg = '{}: heartbeat oxlog: {}'.format(me, E)
                             DOSQUAWK(errmsg)
                             raise
                     if OFILE:
                         try:
-                            OFILE.write(orec + '\n')    # Opened with encoding=ENCODING, errors=ERRORS.
+                            OFILE.write(orec if orec.__class__ is bytes else orec + '\n')
                         except Exception as E:
                             errmsg = '{}: heartbeat ofile: {}'.format(me, E)
                             DOSQUAWK(errmsg)
@@ -1287,6 +3898,8 @@ def watcherThread():                                                # !WT!
                                 else:
                                     1/1
                                 nrolled += 1
+                            if SNAPSHOT:
+                                SNAPSHOT.invalidate(WATCHPATH)
                         except Exception as E:
                             errmsg = '{}: {} @ {}'.format(me, E, _m.tblineno())
                             DOSQUAWK(errmsg)
@@ -1350,6 +3963,11 @@ def watcherThread():                                                # !WT!
                 kfis2 = getFIs(WORKPATH, 2)
                 if not kfis2:
                     break
+                if GZWORKERS > 1 and len(kfis2) > 1:
+                    sendStaticFilesPooled(kfis2)
+                    if FWTSTOP:
+                        break
+                    continue
                 1/1
                 for fi in kfis2:
                     1/1
@@ -1360,11 +3978,11 @@ def watcherThread():                                                # !WT!
                     if '.logx.' in src:
                         1/1
                         # .gz'd *.logx files are uninteresting.
-                        os.remove(src)
+                        removeFile(src)
                         continue
                     snk = os.path.join(SENTPATH, fi.filename)
                     if sendStaticFile(ae, '-GZ-{}'.format(fi.filename), src):
-                        shutil.move(src, snk)
+                        moveFile(src, snk)
                     else:
                         _m.beep(3)
                         errmsg = 'sendStaticFile({}) failed!'.format(src)
@@ -1412,26 +4030,41 @@ def watcherThread():                                                # !WT!
                         msg = 'no .logx.1 file for: {}'.format(fi1.filename)
                         _yl.warning(ae, msg, d=True)
                         logxdata.verified = True    # Can't be verified.
-                    # Trust logxdata.sent, but verify the crc (and only once).
-                    fi1.sent = logxdata.sent
-                    if logxdata.sent:
-                        if not logxdata.verified:
-                            with open(src, 'rb') as f:
-                                1/1
-                                bs = f.read(logxdata.sent)
-                                # ??? Check that bs ends with a \n?
-                                fi1.crc = binascii.crc32(bs, 0)
-                            if fi1.crc != logxdata.crc:
-                                fi1.sent = 0 
-                            logxdata.verified = True        # Verify crc only once!
-                    else:
-                        logxdata.verified = True    # Can't be verified.
-                    1/1
-                    nbs = incrementDynamicFile(ae, fi1, logxdata)
+                    # One mapping for both the crc verification and the tail.
+                    mm = openMapped(src) if MMAP1S else None
+                    try:
+                        # Trust logxdata.sent, but verify the crc (and only once),
+                        # backing off to the last good checkpoint on a mismatch.
+                        fi1.sent = logxdata.sent
+                        if logxdata.sent:
+                            if not logxdata.verified:
+                                if mm is not None:
+                                    sent, crc = verifyLogxData(logxdata, len(mm), 
+                                                    lambda a, b, c: crc32Mapped(mm, a, b, c))
+                                else:
+                                    with open(src, 'rb') as f:
+                                        1/1
+                                        sent, crc = verifyLogxData(logxdata, fi1.size, 
+                                                        lambda a, b, c: crc32File(f, a, b, c))
+                                if sent != logxdata.sent:
+                                    _m.beep(1)
+                                    msg = 'crc mismatch: resending {} from {:,d} (not {:,d})'.format(fi1.filename, sent, logxdata.sent)
+                                    _yl.warning(ae, msg, d=True)
+                                    logxdata.sent, logxdata.crc = sent, crc
+                                    logxdata.ckpts = [z for z in getattr(logxdata, 'ckpts', []) if z[0] <= sent]
+                                fi1.sent, fi1.crc = sent, crc
+                                logxdata.verified = True        # Verify crc only once!
+                        else:
+                            logxdata.verified = True    # Can't be verified.
+                        1/1
+                        nbs = incrementDynamicFile(ae, fi1, logxdata, mm=mm)
+                    finally:
+                        if mm is not None:
+                            mm.close()                  # Before the move (Windows).
                     putLogxData(logxdata, WORKPATH, logtype, sfx='.1')
                     1/1
                     # Done
-                    shutil.move(src, snk)
+                    moveFile(src, snk)
                     zapLogxData(WORKPATH, logtype, sfx='.1')
                     _yl.warning(ae, '{} sent    {}'.format(_dt.ut2iso(_dt.locut()), fi1.filename), d=True)
                     _yl.ydataclose()
@@ -1464,10 +4097,10 @@ def watcherThread():                                                # !WT!
                     if '.logx.' in fi2.filename:
                         1/1
                         # .gz'd *.logx files are uninteresting.
-                        os.remove(src)
+                        removeFile(src)
                         continue
                     snk = os.path.join(WORKPATH, nextWORKSENTfnpfx() + fi2.filename)
-                    shutil.move(src, snk)
+                    moveFile(src, snk)
                     _yl.info(None, '{} -> {}'.format(os.path.split(src)[1], os.path.split(snk)[1]))
                     1/1
                 1/1
@@ -1495,7 +4128,7 @@ def watcherThread():                                                # !WT!
                     snk = os.path.join(WORKPATH, fi1.filename)  # No prefix for .logx.1 files.
                 else:
                     snk = os.path.join(WORKPATH, nextWORKSENTfnpfx() + fi1.filename)
-                shutil.move(src, snk)
+                moveFile(src, snk)
                 _yl.info(None, '{} -> {}'.format(os.path.split(src)[1], os.path.split(snk)[1]))
                 1/1
             1/1
@@ -1573,6 +4206,7 @@ def watcherThread():                                                # !WT!
                 return _ns(modified=0,
                            sent=0,
                            crc=0,
+                           ckpts=[],        # [(offset, crc), ...], see ckptLogxData.
                            size=0,
                            verified=False)
             with open(p, 'rb') as f:
@@ -1605,7 +4239,7 @@ def watcherThread():                                                # !WT!
         """Zap data for *.log file."""
         1/1
         p = os.path.join(dir, logtype + '.logx' + sfx)
-        try:    os.remove(p)
+        try:    removeFile(p)
         except: pass
 
     #
@@ -1613,31 +4247,68 @@ def watcherThread():                                                # !WT!
     #
     me = 'watcherThread'
     _yl.info(None, me + ' starts')
+    inotify = None
     try:
         FWTRUNNING = True
 
+        # Event driven?
+        if INOTIFY and gLIN:
+            try:
+                inotify = Inotify(WATCHPATH)
+                _yl.info(None, 'inotify on ' + WATCHPATH)
+            except Exception as E:
+                _yl.warning(None, 'no inotify, polling every {}s: {}'.format(INTERVAL, E))
+
         # Inits.
         uu = 0                                                  # Unix Utc. 
+        tick = 0                                                # Last INTERVAL cycle.
         prev_wfis0 = []                                         # prev_wfis0 must exist (and be a list).
         while not FWTSTOP:
 
-            _yl._flush()
-           
-            # Wait out INTERVAL.                                # !WT!
+            # Wait out INTERVAL (or until a WATCHPATH event).  # !WT!
             z = time.time()
             w = INTERVAL - (z - uu)
-            if w > 0:
-                _sw.wait(w)
+            if inotify:
+                m = MININTERVAL - (z - uu)
+                if m > 0:
+                    time.sleep(m)               # Coalesce bursts of appends.
+                w -= max(m, 0)
+            # In slices of at most BATCHAGE, so a partial frame waits 
+            # BATCHAGE, not INTERVAL.
+            while w > 0 and not FWTSTOP:
+                t = time.time()
+                z = min(w, BATCHAGE) if BATCHER and BATCHAGE > 0 else w
+                if inotify:
+                    if inotify.wait(z):
+                        break
+                else:
+                    _sw.wait(z)
+                if BATCHER:
+                    BATCHER.poll()
+                w -= time.time() - t
             uu = _dt.utcut()
             ul = _dt.locut(uu)
             uuts = '{:15.4f}'.format(uu)                        # 15.4, unblanked fraction.
             uuiosfs = _dt.ut2isofs(uu)
             uliosfs = _dt.ut2isofs(ul)
 
+            # An INTERVAL cycle, or one woken early by a WATCHPATH event?
+            # Event cycles (as often as MININTERVAL) only take WATCHPATH's
+            # changes (stages 1, 4, 5, 6); the rest (trace file flushes,
+            # heartbeats, WORKPATH, compaction) stays on INTERVAL.
+            timed = uu - tick >= INTERVAL or not inotify
+            if timed:
+                tick = uu
+                _yl._flush()
+
+            # This cycle's WATCHPATH and WORKPATH (scanned as used).
+            SNAPSHOT = DirSnapshot()
+
             #
             # 0. Send a heartbeat.                          # _dt.ut2iso(_dt.locut(), '~')
             #
-            sendHeartbeat()
+            if timed:
+                sendHeartbeat()
 
             #
             # 1. Blocked by a log roll?
@@ -1649,12 +4320,14 @@ def watcherThread():                                                # !WT!
             #
             # 2. Send WORKPATH .gz's.
             # 
-            sendWORKPATHgzs()
+            if timed:
+                sendWORKPATHgzs()
 
             #
             # 3. Send WORKPATH .1's.
             # 
-            sendWORKPATH1s()
+            if timed:
+                sendWORKPATH1s()
 
             #
             # 4. Send WATCHPATH .gz's to WORKPATH.
@@ -1675,6 +4348,16 @@ def watcherThread():                                                # !WT!
             #
             incrementallySendLOGs()
 
+            #
+            # 7. Compact SENTPATH (in the background).
+            #
+            if timed:
+                startCompaction()
+
+            # Send an aged batch, collect acks.
+            if BATCHER:
+                BATCHER.poll()
+
     except KeyboardInterrupt as E:
         FWTSTOP = True
         # watcherThread:
@@ -1688,12 +4371,81 @@ def watcherThread():                                                # !WT!
         DOSQUAWK(errmsg)
         raise      
     finally:
+        SNAPSHOT = None
+        if inotify:
+            inotify.close()
         if FWTSTOP:
             FWTSTOPPED = True
         _yl.info(None, '{} exits. STOPPED: {}'.format(me, str(FWTSTOPPED)))
         FWTRUNNING = False
         1/1
 
+#
+# DirSnapshot
+#
+# One watcherThread cycle's view of WATCHPATH and WORKPATH: a directory
+# is os.scandir'd once, on first use, and a file is stat'd once, when a
+# stage first asks for it.  The stages' own moves and removes (moveFile,
+# removeFile) update the snapshot rather than forcing a re-scan.
+# SNAPSHOT None (outside watcherThread) -> plain listdir/stat.
+#
+SNAPSHOT = None
+
+class DirSnapshot():
+
+    def __init__(self):
+        self.dirs = {}                          # path -> {filename: DirEntry or stat_result}
+
+    def files(self, path):
+        """{filename: ...} of path, scanned once."""
+        path = os.path.normpath(path)
+        z = self.dirs.get(path)
+        if z is None:
+            z = {}
+            with os.scandir(path) as it:
+                for de in it:
+                    z[de.name] = de
+            self.dirs[path] = z
+        return z
+
+    def stat(self, path, fn):
+        """Cached stat of path/fn (None if it's not there)."""
+        z = self.files(path)
+        st = z.get(fn)
+        if st is not None and not isinstance(st, os.stat_result):
+            try:
+                if st == 'moved': st = z[fn] = os.stat(os.path.join(path, fn))
+                else:             st = z[fn] = st.stat()
+            except OSError:
+                # fn possibly got renamed
+                del z[fn]
+                st = None
+        return st
+
+    def moved(self, srcpath, srcfn, snkpath, snkfn):
+        self.dirs.get(os.path.normpath(srcpath), {}).pop(srcfn, None)
+        z = self.dirs.get(os.path.normpath(snkpath))
+        if z is not None:
+            z[snkfn] = 'moved'                  # stat'd when asked for.
+
+    def removed(self, path, fn):
+        self.dirs.get(os.path.normpath(path), {}).pop(fn, None)
+
+    def invalidate(self, path):
+        self.dirs.pop(os.path.normpath(path), None)
+
+def moveFile(src, snk):
+    """shutil.move, keeping SNAPSHOT current."""
+    shutil.move(src, snk)
+    if SNAPSHOT:
+        SNAPSHOT.moved(*(os.path.split(src) + os.path.split(snk)))
+
+def removeFile(p):
+    """os.remove, keeping SNAPSHOT current."""
+    os.remove(p)
+    if SNAPSHOT:
+        SNAPSHOT.removed(*os.path.split(p))
+
 #
 # getFI
 #
@@ -1710,7 +4462,10 @@ def getFI(loc, ft, fn):
             return fi
         pfn = os.path.join(location2path(loc), fn)
         try:
-            st    = os.stat(pfn)
+            if SNAPSHOT:
+                st = SNAPSHOT.stat(location2path(loc), fn)
+            else:
+                st = os.stat(pfn)
             size  = st.st_size
             mtime = st.st_mtime
         except:
@@ -1756,7 +4511,11 @@ def getFIs(loc, ft, x=False):
     me = 'getFIs'
     fis = []
     try:
-        for filename in os.listdir(location2path(loc)):
+        if SNAPSHOT:
+            filenames = list(SNAPSHOT.files(location2path(loc)))
+        else:
+            filenames = os.listdir(location2path(loc))
+        for filename in filenames:
             if not doFilename(ft, filename, x=x):
                 continue
             fi = getFI(loc, ft, filename)
@@ -1777,6 +4536,11 @@ def maininits():
     global gRPFN, gRFILE
     global WATCHPATH, WORKPATH, SENTPATH, INTERVAL, XFILE, YLOGPATH
     global NEXTROLL, ROLLPERIOD, DO_LOGROLL
+    global LOGFORMAT, ACCESSLF, GZWORKERS
+    global COMPACTHOURS, RETAINDAYS
+    global BATCHBYTES, BATCHAGE, PIPEWORKERS, OXLOGWAIT, WIRE
+    global TXRATE, TXRECS, TXBYTES, TXBURST, SPOOLDIR, XLOGMODE
+    global OFILEROTATE, OFILEMAXMB, OFILEZ, OFILESYNC, OFILESYNCSECS
     me = 'maininits'
     _yl.info(None, me)
     try:
@@ -1792,11 +4556,41 @@ def maininits():
         WORKPATH = _a.argString('work', 'work path', WORKPATH)
         SENTPATH = _a.argString('sent', 'sent path', SENTPATH)
         INTERVAL = _a.argFloat('interval', 'cylce interval', INTERVAL)
-        XFILE = _a.argString('xfile', 'filename or xlog ip', XFILE)
+        XFILE = _a.argString('xfile', 'filename or xlog ip(s)', XFILE)
         YLOGPATH = _a.argString('ypath', 'trace path', YLOGPATH)
         NEXTROLL = _a.argString('nr', 'next roll', NEXTROLL)
         ROLLPERIOD = _a.argString('rp', 'roll period', ROLLPERIOD)
         DO_LOGROLL = bool(ROLLPERIOD)
+        setOrecFormat(_a.argString('orecformat', 'orec format: json or binary', ORECFORMAT))
+        LOGFORMAT = _a.argString('logformat', 'access log_format', LOGFORMAT)
+        if LOGFORMAT:
+            ACCESSLF = compileLogFormat(LOGFORMAT)
+        GZWORKERS = int(_a.argFloat('gzworkers', '.gz parsing processes', GZWORKERS))
+        COMPACTHOURS = _a.argFloat('compact', 'hours between SENTPATH compactions', COMPACTHOURS)
+        RETAINDAYS = _a.argFloat('retain', 'days of SENTPATH bundles kept', RETAINDAYS)
+        BATCHBYTES = int(_a.argFloat('batchbytes', 'xlog frame bytes', BATCHBYTES))
+        BATCHAGE = _a.argFloat('batchage', 'xlog frame max age', BATCHAGE)
+        PIPEWORKERS = int(_a.argFloat('pipeworkers', 'parser threads', PIPEWORKERS))
+        OXLOGWAIT = _a.argFloat('oxlogwait', 'oxlog drain deadline', OXLOGWAIT)
+        WIRE = _a.argString('wire', 'xlog wire format (raw, zlib)', WIRE)
+        if WIRE not in ('raw', 'zlib'):
+            raise ValueError('unknown wire: {}'.format(WIRE))
+        TXRATE = _a.argFloat('txrate', 'max transmissions per sec', TXRATE)
+        TXRECS = _a.argFloat('txrecs', 'max records per sec', TXRECS or TXRATE)
+        TXBYTES = _a.argFloat('txbytes', 'max bytes per sec', TXBYTES)
+        TXBURST = _a.argFloat('txburst', 'burst seconds', TXBURST)
+        SPOOLDIR = _a.argString('spool', 'spool dir (in work path)', SPOOLDIR)
+        XLOGMODE = _a.argString('xlogmode', 'xlog endpoints: failover or hash', XLOGMODE)
+        if XLOGMODE not in ('failover', 'hash'):
+            raise ValueError('unknown xlogmode: {}'.format(XLOGMODE))
+        OFILEROTATE = _a.argString('orotate', 'xfile partitions: none or hour', OFILEROTATE)
+        OFILEMAXMB = _a.argFloat('omaxmb', 'xfile partition MB', OFILEMAXMB)
+        OFILEZ = _a.argString('ocompress', "xfile compression: '' or gz", OFILEZ)
+        OFILESYNC = _a.argString('osync', 'xfile sync: none, flush or fsync', OFILESYNC)
+        OFILESYNCSECS = _a.argFloat('osyncsecs', 'xfile sync interval', OFILESYNCSECS)
+        if (OFILEROTATE not in ('none', 'hour') or OFILEZ not in ('', 'gz') or 
+            OFILESYNC not in ('none', 'flush', 'fsync')):
+            raise ValueError('bad xfile options: {} {} {}'.format(OFILEROTATE, OFILEZ, OFILESYNC))
 
     except Exception as E:
         errmsg = '{}: {} @ {}'.format(me, E, _m.tblineno())
@@ -1811,7 +4605,7 @@ def maininits():
 def main():
     global WATCHPATH, WORKPATH, SENTPATH, YLOGPATH, INTERVAL
     global FWTSTOP, FWTSTOPPED
-    global OXLOG, OFILE
+    global OXLOG, OFILE, BATCHER, TXBUCKET, SPOOL
     me = 'main'
     watcher_thread = None
     try:
@@ -1844,24 +4638,32 @@ def main():
         _yl.info(None, ' interval: ' + str(INTERVAL))
         _yl.info(None)
 
-        # XFILE: output to OXLOG (via host:port) or to a dev/test filename (via OFILE).
+        # XFILE: output to OXLOG (via host:port[,host:port...]) or to a dev/test filename (via OFILE).
         OXLOG = OFILE = None
-        host, port = detectHP(XFILE)
-        if host and port:
-            try:
-                OXLOG = XLogTxRx((host, port), txrate=TXRATE)
-            except Exception as E:
-                errmsg = '{}: cannot create XLogTxRX: {}'.format(me, E)
-                DOSQUAWK(errmsg)
-                raise
+        hps = detectHPs(XFILE)
+        if hps:
+            if TXRECS or TXBYTES:
+                TXBUCKET = TokenBucket(TXRECS, TXBYTES, TXBURST)
+            if len(hps) > 1:
+                # The pool batches (if at all) per connection.
+                OXLOG = BATCHER = XLOGPool(hps, XLOGMODE)
+            else:
+                try:
+                    OXLOG = XLogTxRx(hps[0], txrate=0)          # TXBUCKET does the pacing.
+                except Exception as E:
+                    errmsg = '{}: cannot create XLogTxRX: {}'.format(me, E)
+                    DOSQUAWK(errmsg)
+                    raise
+                if BATCHBYTES > 0 or WIRE != 'raw':
+                    # Compressed frames need batches.
+                    BATCHER = XLOGBatcher(OXLOG, BATCHBYTES or 64 * 1024, BATCHAGE, WIRE)
+            if SPOOLDIR:
+                SPOOL = Spool(os.path.join(WORKPATH, SPOOLDIR))
         else:
             try:
                 if XFILE:
                     opfn = XFILE
-                    if os.path.isfile(opfn):
-                        OFILE = open(opfn, 'a', encoding=ENCODING, errors=ERRORS)
-                    else:
-                        OFILE = open(opfn, 'w', encoding=ENCODING, errors=ERRORS)
+                    OFILE = FileSink(opfn)
             except Exception as E:
                 errmsg = '{}: cannot open output file {}: {}'.format(me, opfn, E)
                 DOSQUAWK(errmsg)
@@ -1895,6 +4697,12 @@ def main():
             FWTSTOP = True
             watcher_thread.join(3 * INTERVAL)
             _yl.info(None, 'thread STOPPED: {}'.format(FWTSTOPPED))
+        if BATCHER:
+            try:    BATCHER.flush()
+            except: pass
+        if SPOOL:
+            try:    SPOOL.close()
+            except: pass
         1/1
 
 if __name__ == '__main__':
@@ -2038,6 +4846,33 @@ if __name__ == '__main__':
 
         EEL, ESL, SRCID, SUBID = '0', '_', 'TEST', 'test'
 
+        if checkAccessParser() != 0:
+            1/1
+
+        if checkAccessBatch() != 0:
+            1/1
+
+        if benchJSONSchema() != 0:          # Or benchJSONSchema('.../access.log.2.gz').
+            1/1
+
+        if not benchGzReader('.../access.log.2.gz'):
+            1/1
+
+        if checkBatching() != 0:
+            1/1
+
+        if not benchWire():                 # Or benchWire('.../access.log.2.gz').
+            1/1
+
+        if checkXLOGPool()[0] == 0 or checkXLOGPool(mode='hash')[0] == 0:
+            1/1
+
+        if checkSpoolPool()[0] < checkSpoolPool.__defaults__[0]:
+            1/1
+
+        if checkBinary() != 0:
+            1/1
+
         rc, rm, chunks = parseLogrec('a', A0)
         rc, rm, orec, vrec = genACCESSorec(chunks, 'a', EEL, ESL, SRCID, SUBID)
         if rc != 0: